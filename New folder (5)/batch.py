@@ -0,0 +1,183 @@
+import argparse
+import csv
+import importlib
+import io
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import ocr_engine
+import result_cache
+import upload_store
+import verification_store
+
+BATCH_LOOKUP_CONCURRENCY = int(os.environ.get("BATCH_LOOKUP_CONCURRENCY", 2))
+DOCUMENT_EXTENSIONS = {"jpg", "jpeg", "png", "pdf"}
+MEDIA_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv"}
+
+# Document type -> app module that owns its extract_document/validate_document.
+DOC_TYPES = {
+    "incorporation": "main",
+    "gst": "main3",
+}
+
+CSV_COLUMNS = {
+    "incorporation": [
+        "file", "company_name", "date_of_incorporation", "llpin", "pan", "digital_signature_name",
+        "validation_status", "gst_details.Company Name", "gst_details.Date of Incorporation",
+        "field_matches.company_name.reason", "field_matches.date_of_incorporation.reason", "error",
+    ],
+    "gst": [
+        "file", "ocr_results.Registration Number", "ocr_results.Legal Name", "ocr_results.Constitution of Business",
+        "ocr_results.Type of Registration", "ocr_results.Registration Date", "web_results.Legal Name",
+        "web_results.Constitution of the Business", "web_results.Registration Date", "web_results.PAN",
+        "web_results.Type of Registration", "field_matches.Legal Name.reason", "field_matches.Registration Date.reason",
+        "field_matches.Constitution of Business.reason", "validation_message", "error",
+    ],
+}
+
+
+# -------------------- Input --------------------
+def is_document(name):
+    return "." in name and name.rsplit(".", 1)[1].lower() in DOCUMENT_EXTENSIONS
+
+
+def check_archive(source, max_document=upload_store.UPLOAD_MAX_BYTES, max_total=upload_store.BATCH_MAX_BYTES):
+    """Raise ``UploadTooLarge`` if a zip's documents, once extracted, are too big one by one or together.
+
+    The sizes come from the archive's directory; zipfile never extracts more
+    than an entry declares, so a zip bomb can't get past them.
+    """
+    with zipfile.ZipFile(source) as archive:
+        members = [m for m in archive.infolist() if not m.is_dir() and is_document(m.filename)]
+    for member in members:
+        if member.file_size > max_document:
+            raise upload_store.UploadTooLarge(f"{member.filename} exceeds {max_document} bytes uncompressed")
+    if sum(member.file_size for member in members) > max_total:
+        raise upload_store.UploadTooLarge(f"Archive documents exceed {max_total} bytes uncompressed")
+
+
+@contextmanager
+def open_documents(source):
+    """Yield ``(name, path)`` pairs for the documents in a directory or zip archive (path or file object)."""
+    if zipfile.is_zipfile(source):
+        check_archive(source)
+        with tempfile.TemporaryDirectory() as workdir, zipfile.ZipFile(source) as archive:
+            members = [m for m in archive.namelist() if not m.endswith("/") and is_document(m)]
+            yield [(member, archive.extract(member, workdir)) for member in sorted(members)]
+    else:
+        yield [(name, os.path.join(source, name)) for name in sorted(os.listdir(source)) if is_document(name)]
+
+
+# -------------------- Pipeline --------------------
+def load_pipeline(doc_type):
+    return importlib.import_module(DOC_TYPES[doc_type])
+
+
+def run_batch(documents, pipeline, lookup_concurrency=BATCH_LOOKUP_CONCURRENCY, refresh=False):
+    """Verify ``documents`` and yield one result row per document as it finishes.
+
+    ``pipeline`` is the app module for the document type, providing
+    ``extract_document`` and ``validate_document``.
+
+    OCR runs on as many threads as there are pooled OCR engines so every
+    engine stays busy, and each document moves on to the registry lookup
+    stage as soon as its OCR is done, with at most ``lookup_concurrency``
+    lookups in flight.
+    """
+    finished = queue.Queue()
+
+    def validate(name, digest, details):
+        try:
+            result = pipeline.validate_document(details, refresh)
+        except Exception as e:
+            finished.put({"file": name, "error": f"Registry lookup failed: {e}"})
+            return
+        verification_store.save(pipeline, digest, name, details, result, source="batch")
+        finished.put(dict(result, file=name))
+
+    def extract(name, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = result_cache.content_hash(data)
+            details = pipeline.extract_document(data, name, digest)
+        except Exception as e:
+            finished.put({"file": name, "error": f"OCR failed: {e}"})
+            return
+        lookups.submit(validate, name, digest, details)
+
+    with ThreadPoolExecutor(lookup_concurrency, thread_name_prefix="lookup") as lookups, \
+            ThreadPoolExecutor(ocr_engine.pool.size, thread_name_prefix="ocr") as ocr_workers:
+        for name, path in documents:
+            ocr_workers.submit(extract, name, path)
+        for _ in documents:
+            yield finished.get()
+
+
+# -------------------- Output --------------------
+def flatten(row, prefix=""):
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def format_rows(rows, doc_type, output_format="jsonl"):
+    """Serialize result rows one line at a time, for streaming to a file or a response."""
+    if output_format == "jsonl":
+        for row in rows:
+            yield json.dumps(row) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS[doc_type], extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(flatten(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify a folder or zip of certificates in bulk.")
+    parser.add_argument("source", help="directory or .zip of certificate images and PDFs")
+    parser.add_argument("--type", dest="doc_type", choices=sorted(DOC_TYPES), default="incorporation")
+    parser.add_argument("--format", dest="output_format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--output", help="file to write results to (default: stdout)")
+    parser.add_argument("--lookup-concurrency", type=int, default=BATCH_LOOKUP_CONCURRENCY)
+    parser.add_argument("--refresh", action="store_true", help="ignore cached registry lookups")
+    args = parser.parse_args(argv)
+
+    ocr_engine.pool.warm_up()
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        with open_documents(args.source) as documents:
+            rows = run_batch(documents, load_pipeline(args.doc_type), args.lookup_concurrency, args.refresh)
+            for line in format_rows(rows, args.doc_type, args.output_format):
+                out.write(line)
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    rate = len(documents) / elapsed * 60 if elapsed else 0.0
+    print(f"Verified {len(documents)} documents in {elapsed:.1f}s ({rate:.1f} documents/minute)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Per-document parse time of the incorporation-certificate field extractor.
+
+Runs on a representative joined-OCR text, so it needs no OCR models:
+
+    python benchmarks/bench_extract.py [--number 20000]
+
+The extractor as it was before field specs (patterns compiled per call,
+one scan per field) is kept below as the baseline.
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import incorporation_fields  # noqa: E402
+
+SAMPLE_TEXT = (
+    "GOVERNMENT OF INDIA MINISTRY OF CORPORATE AFFAIRS Central Registration Centre Certificate of Incorporation "
+    "[Pursuant to sub-section (2) of section 7 and sub-section (1) of section 8 of the Companies Act, 2013 (18 of 2013) "
+    "and rule 18 of the Companies (Incorporation) Rules, 2014] I hereby certify that ACME SOFTWARE PRIVATE LIMITED "
+    "is incorporated on this Twenty-first day of March Two thousand nineteen under the Companies Act, 2013 (18 of 2013) "
+    "and that the company is limited by shares. The Corporate Identity Number of the company is U72900KA2019PTC123456. "
+    "The Permanent Account Number(PAN) of the company is AABCA1234C. The Tax Deduction and Collection Account Number "
+    "(TAN) of the company is BLRA12345B. Given under my hand at Manesar this Twenty-second day of March Two thousand "
+    "nineteen. Digital Signature Certificate RAMESH KUMAR For and on behalf of the Jurisdictional Registrar of Companies "
+    "Registrar of Companies Central Registration Centre"
+)
+
+
+def legacy_parse(extracted_text):
+    company_name_match = re.search(r"hereby certify that (.+?) is incorporated on", extracted_text, re.IGNORECASE)
+    company_name = company_name_match.group(1).upper() if company_name_match else "COMPANY NAME NOT FOUND"
+    date_in_words_match = re.search(r"incorporated on (.+?) under the Companies Act", extracted_text, re.IGNORECASE)
+    date_of_incorporation = "Date not found"
+    if date_in_words_match:
+        date_in_words = date_in_words_match.group(1)
+        day_map = {
+            "First": "01", "Second": "02", "Third": "03", "Fourth": "04", "Fifth": "05", "Sixth": "06",
+            "Seventh": "07", "Eighth": "08", "Ninth": "09", "Tenth": "10", "Eleventh": "11", "Twelfth": "12",
+            "Thirteenth": "13", "Fourteenth": "14", "Fifteenth": "15", "Sixteenth": "16", "Seventeenth": "17",
+            "Eighteenth": "18", "Nineteenth": "19", "Twentieth": "20", "Twenty-first": "21", "Twenty-second": "22",
+            "Twenty-third": "23", "Twenty-fourth": "24", "Twenty-fifth": "25", "Twenty-sixth": "26",
+            "Twenty-seventh": "27", "Twenty-eighth": "28", "Twenty-ninth": "29", "Thirtieth": "30", "Thirty-first": "31"
+        }
+        month_map = {m: m for m in ["January", "February", "March", "April", "May", "June", "July", "August",
+                                    "September", "October", "November", "December"]}
+        day_match = re.search(r"(" + "|".join(day_map.keys()) + ")", date_in_words)
+        month_match = re.search(r"(" + "|".join(month_map.keys()) + ")", date_in_words)
+        year_match = re.search(r"Two thousand (\w+)", date_in_words, re.IGNORECASE)
+        if day_match and month_match and year_match:
+            year_lookup = {"nineteen": "2019", "eighteen": "2018", "twenty": "2020"}
+            year = year_lookup.get(year_match.group(1).lower(), "20" + year_match.group(1).lower())
+            date_of_incorporation = f"{day_map[day_match.group(1)]} {month_map[month_match.group(1)]} {year}"
+    llpin_match = re.search(r"Identity Number of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
+    llpin = llpin_match.group(1) if llpin_match else "LLPIN / CIN not found"
+    pan = "PAN not found"
+    for pattern in (r"Permanent Account Number\(PAN\) of the company is\s*([^\s]+)",
+                    r"\(PAN\) of the company is\s*([^\s]+)",
+                    r"Permanent Account Number\(PAN\)of the company is\s*([^\s]+)"):
+        pan_match = re.search(pattern, extracted_text, re.IGNORECASE)
+        if pan_match:
+            pan = pan_match.group(1)
+            break
+    ds_match = re.search(r"Digital Signature Certificate\s*(.+?)\s*For and on behalf of", extracted_text, re.IGNORECASE)
+    digital_signature_name = ds_match.group(1).strip() if ds_match else "Digital Signature Name not found"
+    return company_name, date_of_incorporation, llpin, pan, digital_signature_name
+
+
+def bench(label, fn, text, number):
+    # Best of five repeats, so a stray scheduler hiccup doesn't skew the result.
+    seconds = min(timeit.repeat(lambda: fn(text), number=number, repeat=5)) / number
+    print(f"{label:<28} {seconds * 1e6:8.1f} us/document")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(incorporation_fields.parse_certificate_text(SAMPLE_TEXT))
+    # The legacy parser shares Python's regex cache (512 entries) with everything else in a real process,
+    # so purge it each call to show the per-request recompile the old code paid.
+    baseline = bench("legacy (recompile per call)", lambda t: (re.purge(), legacy_parse(t)), SAMPLE_TEXT, args.number)
+    bench("legacy (warm regex cache)", legacy_parse, SAMPLE_TEXT, args.number)
+    current = bench("field specs", incorporation_fields.parse_certificate_text, SAMPLE_TEXT, args.number)
+    print(f"speed-up vs. recompiling legacy parser: {baseline / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""OCR latency and field accuracy with and without image preprocessing.
+
+Runs each certificate in ``uploads/`` through OCR as the raw file and as
+preprocessed arrays at several long-side limits, and reports latency and how
+many fields still match the raw run:
+
+    python benchmarks/bench_preprocess.py [--sides 2000 1600 1280 960] [--repeat 3]
+
+Needs the PaddleOCR models (downloaded on first use).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import incorporation_fields  # noqa: E402
+import ocr_engine  # noqa: E402
+import preprocess  # noqa: E402
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+def ocr_fields(img):
+    lines = ocr_engine.read_lines(img)
+    text = " ".join(line.text for line in lines)
+    # GST certificates don't match the incorporation fields, so compare on the recognized lines as well.
+    return incorporation_fields.extract_fields(text), {line.text for line in lines}
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sides", type=int, nargs="+", default=[2000, 1600, 1280, 960])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=UPLOAD_DIR)
+    args = parser.parse_args()
+
+    ocr_engine.pool.warm_up()
+    paths = sorted(os.path.join(args.dir, name) for name in os.listdir(args.dir)
+                   if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    for path in paths:
+        print(os.path.basename(path))
+        raw_seconds, (raw_fields, raw_lines) = timed(lambda: ocr_fields(path), args.repeat)
+        print(f"  {'raw file':<14} {raw_seconds * 1000:8.0f} ms")
+        for side in args.sides:
+            def run():
+                return ocr_fields(preprocess.load_image(path, max_side=side))
+            seconds, (fields, lines) = timed(run, args.repeat)
+            same_fields = sum(fields[name] == raw_fields[name] for name in incorporation_fields.FIELD_NAMES)
+            same_lines = len(lines & raw_lines) / len(raw_lines) if raw_lines else 1.0
+            print(f"  {'max side ' + str(side):<14} {seconds * 1000:8.0f} ms  {raw_seconds / seconds:4.1f}x  "
+                  f"fields {same_fields}/{len(incorporation_fields.FIELD_NAMES)}  lines {same_lines:.0%}")
+
+
+if __name__ == "__main__":
+    main()
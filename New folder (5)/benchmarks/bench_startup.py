@@ -0,0 +1,152 @@
+"""Startup time of each app: until it answers /healthz, and until /readyz reports its pools warm.
+
+    python benchmarks/bench_startup.py [--apps main main2 main3 service] [--runs 3] [--ready-timeout 300]
+
+Each run starts the app in a fresh interpreter on a free port, as a newly
+scaled-out instance would, and polls it. The time to import the app module is
+reported too, since nothing can be served before it finishes. Without Chrome
+installed, set ``READINESS_POOLS=ocr`` or readiness will time out.
+"""
+import argparse
+import importlib
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run import RESULTS_DIR, git_commit  # noqa: E402
+
+FLASK_APPS = {"main", "main2"}
+APPS = ["main", "main2", "main3", "service"]
+POLL_INTERVAL = 0.05
+
+
+# -------------------- App Process --------------------
+def serve(app_name, port, report):
+    """Child side: import the app, write how long that took to ``report``, then serve it."""
+    start = time.perf_counter()
+    module = importlib.import_module(app_name)
+    with open(report, "w") as f:
+        json.dump({"import_s": round(time.perf_counter() - start, 3)}, f)
+
+    if app_name in FLASK_APPS:
+        from werkzeug.serving import make_server
+
+        import warmup
+
+        # As under `python main.py` or serve.py; the FastAPI apps do this in their startup hook.
+        warmup.start()
+        make_server("127.0.0.1", port, module.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+
+        uvicorn.run(module.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# -------------------- Measurement --------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, deadline, child):
+    """Seconds-since-launch timestamp at which ``url`` first answered 200, and its body; None on timeout."""
+    while time.perf_counter() < deadline and child.poll() is None:
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code == 200:
+                return time.perf_counter(), response.json()
+        except httpx.HTTPError:
+            pass
+        time.sleep(POLL_INTERVAL)
+    return None, None
+
+
+def measure(app_name, ready_timeout, verbose=False):
+    port = free_port()
+    report = os.path.join(tempfile.mkdtemp(prefix="ocr-startup-"), "import.json")
+    output = None if verbose else subprocess.DEVNULL
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", app_name, "--port", str(port),
+                              "--report", report], cwd=ROOT, stdout=output, stderr=output)
+    try:
+        deadline = start + ready_timeout
+        live_at, _ = wait_for(f"http://127.0.0.1:{port}/healthz", deadline, child)
+        ready_at, readiness = wait_for(f"http://127.0.0.1:{port}/readyz", deadline, child) if live_at else (None, None)
+    finally:
+        child.terminate()
+        child.wait()
+
+    result = {"import_s": None, "healthz_s": None, "ready_s": None, "pools": (readiness or {}).get("pools")}
+    if os.path.exists(report):
+        with open(report) as f:
+            result.update(json.load(f))
+    if live_at:
+        result["healthz_s"] = round(live_at - start, 3)
+    if ready_at:
+        result["ready_s"] = round(ready_at - start, 3)
+    return result
+
+
+def median(runs, key):
+    values = [run[key] for run in runs if run[key] is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+# -------------------- Results --------------------
+def save(run):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "startup-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def print_results(results):
+    print(f"{'app':<10} {'import s':>10} {'healthz s':>10} {'ready s':>10}")
+    for app_name, row in results.items():
+        cells = [f"{row[key]:>10.2f}" if row[key] is not None else f"{'-':>10}"
+                 for key in ("import_s", "healthz_s", "ready_s")]
+        print(f"{app_name:<10} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=APPS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ready-timeout", type=float, default=300, help="seconds")
+    parser.add_argument("--verbose", action="store_true", help="show the apps' output")
+    parser.add_argument("--serve", choices=APPS, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port, args.report)
+
+    # Fresh stores, so a run isn't slowed or sped up by what an earlier one left behind.
+    scratch = tempfile.mkdtemp(prefix="ocr-startup-")
+    os.environ["CACHE_DB_PATH"] = os.path.join(scratch, "cache.sqlite3")
+    os.environ["VERIFICATION_DB_PATH"] = os.path.join(scratch, "verifications.sqlite3")
+    os.environ["UPLOAD_AUDIT"] = "0"
+
+    runs = {app_name: [measure(app_name, args.ready_timeout, args.verbose) for _ in range(args.runs)]
+            for app_name in args.apps}
+    results = {app_name: {key: median(app_runs, key) for key in ("import_s", "healthz_s", "ready_s")}
+               for app_name, app_runs in runs.items()}
+    print_results(results)
+    print(f"saved {save({'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), 'runs': runs, 'results': results})}")
+
+
+if __name__ == "__main__":
+    main()
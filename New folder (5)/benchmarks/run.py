@@ -0,0 +1,241 @@
+"""Benchmark suite: the extractors in isolation and every app's upload path, against recorded registry pages.
+
+    python benchmarks/run.py [--copies 4] [--concurrency 1 2 4] [--apps main main2 main3]
+    python benchmarks/run.py --compare benchmarks/results/<earlier run>.json
+
+The corpus is the images in ``uploads/``, each repeated ``--copies`` times
+with a unique trailer so every copy has its own content hash and really goes
+through OCR instead of the result cache. zaubacorp and cleartax are served by
+``fixture_server.py``, so no browser or network is used. Reports p50/p95
+latency, documents per second at each concurrency level and peak RSS, and
+saves everything to ``benchmarks/results/`` for comparison between runs.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import fixture_server  # noqa: E402
+
+UPLOAD_DIR = os.path.join(ROOT, "uploads")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+# Registry page served for identifiers that have no recorded fixture of their own.
+DEFAULT_FIXTURES = {"zaubacorp": "U72900KA2019PTC123456", "cleartax": "29AABCA1234C1Z5"}
+# Settings that change results, recorded with each run.
+CONFIG_VARS = ["OCR_POOL_SIZE", "OCR_CPU_THREADS", "OCR_MAX_SIDE", "OCR_STREAMING", "OCR_STREAM_BATCH",
+               "JOB_WORKERS", "SPECULATIVE_LOOKUP", "LOOKUP_RATE"]
+POLL_INTERVAL = 0.05
+
+
+def setup_environment():
+    """Point the registries at the fixture server and the caches and history at throwaway files, before any app is imported."""
+    server, base_url = fixture_server.start_fixture_server(defaults=DEFAULT_FIXTURES)
+    os.environ["ZAUBACORP_BASE_URL"] = f"{base_url}/zaubacorp"
+    os.environ["CLEARTAX_BASE_URL"] = f"{base_url}/cleartax"
+    scratch = tempfile.mkdtemp(prefix="ocr-bench-")
+    os.environ["CACHE_DB_PATH"] = os.path.join(scratch, "cache.sqlite3")
+    # Otherwise the fake uploads would land in the real history and later be re-checked against the live sites.
+    os.environ["VERIFICATION_DB_PATH"] = os.path.join(scratch, "verifications.sqlite3")
+    os.environ["UPLOAD_AUDIT"] = "0"
+    # The fixture server needs no protection, and the registry rate limit would otherwise set the pace.
+    os.environ.setdefault("LOOKUP_RATE", "1000")
+    return server
+
+
+def load_corpus(copies):
+    documents = []
+    for name in sorted(os.listdir(UPLOAD_DIR)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            with open(os.path.join(UPLOAD_DIR, name), "rb") as f:
+                documents.append((name, f.read()))
+    return documents * copies
+
+
+def unique(data, tag):
+    # Decoders stop at the image's end marker, so a trailer changes the hash but not the pixels.
+    return data + f"\nbench:{tag}".encode()
+
+
+# -------------------- Measurement --------------------
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies, elapsed):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "docs_per_sec": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_concurrently(items, fn, concurrency):
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, items))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def repeat(fn, number):
+    latencies = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, sum(latencies))
+
+
+# -------------------- Isolated Extractors --------------------
+def bench_extractors(corpus, repeats):
+    import main
+    import main3
+    import ocr_engine
+    import preprocess
+
+    results = {"extract_details_from_image": run_concurrently(
+        [unique(data, f"isolated-{i}") for i, (_, data) in enumerate(corpus)],
+        main.extract_details_from_image, 1)}
+
+    # The GST parsers work on OCR lines, so OCR each distinct image once and time only the parsing.
+    lines = [ocr_engine.read_lines(preprocess.load_image(data)) for data in dict(corpus).values()]
+    for parser in (main3.extract_with_first_method, main3.extract_with_second_method):
+        results[parser.__name__] = repeat(lambda: [parser(page) for page in lines], repeats)
+    return results
+
+
+# -------------------- Upload Paths --------------------
+def flask_uploader(module):
+    def upload(name, data):
+        client = module.app.test_client()
+        response = client.post("/", data={"file": (io.BytesIO(data), name), "refresh": "1"},
+                               headers={"Accept": "application/json"})
+        return client, response.get_json()["status_url"]
+
+    return upload
+
+
+def fastapi_uploader(module):
+    from fastapi.testclient import TestClient
+
+    def upload(name, data):
+        client = TestClient(module.app)
+        response = client.post("/upload/?refresh=true", files={"file": (name, data)},
+                               headers={"Accept": "application/json"})
+        return client, response.json()["status_url"]
+
+    return upload
+
+
+UPLOADERS = {"main": flask_uploader, "main2": flask_uploader, "main3": fastapi_uploader}
+
+
+def bench_app(app_name, corpus, levels):
+    import importlib
+
+    upload = UPLOADERS[app_name](importlib.import_module(app_name))
+
+    def verify(document):
+        client, status_url = upload(*document)
+        while True:
+            status = client.get(status_url).json()
+            if status["status"] in ("done", "failed"):
+                return status
+            time.sleep(POLL_INTERVAL)
+
+    return {
+        f"{app_name}.upload_file@{level}": run_concurrently(
+            [(name, unique(data, f"{app_name}-{level}-{i}")) for i, (name, data) in enumerate(corpus)],
+            verify, level)
+        for level in levels
+    }
+
+
+# -------------------- Results --------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(run):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':<40} {'n':>4} {'p50 ms':>10} {'p95 ms':>10} {'docs/s':>8} {'RSS MB':>8}")
+    for name, row in results.items():
+        line = (f"{name:<40} {row['count']:>4} {row['p50_ms']:>10.2f} {row['p95_ms']:>10.2f} "
+                f"{row['docs_per_sec'] or 0:>8.2f} {row['peak_rss_mb']:>8.1f}")
+        before = (baseline or {}).get(name)
+        if before and before["p50_ms"]:
+            line += f"   p50 {(row['p50_ms'] / before['p50_ms'] - 1) * 100:+.0f}% vs. baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--apps", nargs="+", choices=sorted(UPLOADERS), default=sorted(UPLOADERS))
+    parser.add_argument("--parse-repeats", type=int, default=1000)
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    server = setup_environment()
+    import ocr_engine
+
+    corpus = load_corpus(args.copies)
+    # Model loading is a startup cost, not a per-document one.
+    ocr_engine.pool.warm_up()
+
+    results = bench_extractors(corpus, args.parse_repeats)
+    for app_name in args.apps:
+        results.update(bench_app(app_name, corpus, args.concurrency))
+    server.shutdown()
+
+    run = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "documents": len(corpus),
+        "config": {name: os.environ.get(name) for name in CONFIG_VARS},
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    print(f"saved {save(run)}")
+
+
+if __name__ == "__main__":
+    main()
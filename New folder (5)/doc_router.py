@@ -0,0 +1,134 @@
+import os
+import sys
+
+import batch
+import layout_fields
+import ocr_engine
+import pdf_pages
+import preprocess
+import result_cache
+import speculative
+import tracing
+import verification_store
+
+# How many leading OCR lines are read before falling back to the whole page.
+ROUTER_HEAD_LINES = int(os.environ.get("ROUTER_HEAD_LINES", 12))
+
+# Phrases printed on each certificate type, matched case-insensitively.
+DOC_TYPE_MARKERS = {
+    "incorporation": ["certificate of incorporation", "ministry of corporate affairs", "corporate identity number",
+                      "companies act", "hereby certify that"],
+    "gst": ["goods and services tax", "form gst reg-06", "registration certificate", "legal name",
+            "constitution of business", "period of validity", "date of validity"],
+}
+# The identifier each registry is searched by; finding one counts for more than any single phrase.
+IDENTIFIER_PATTERNS = {"incorporation": speculative.CIN_RE, "gst": speculative.GSTIN_RE}
+IDENTIFIER_WEIGHT = 3
+
+
+def pipeline(doc_type):
+    return batch.load_pipeline(doc_type)
+
+
+# -------------------- Classification --------------------
+def score(texts, doc_type):
+    lowered = [text.lower() for text in texts]
+    phrases = sum(any(marker in text for text in lowered) for marker in DOC_TYPE_MARKERS[doc_type])
+    identifier = any(IDENTIFIER_PATTERNS[doc_type].search(text) for text in texts)
+    return phrases + IDENTIFIER_WEIGHT * identifier
+
+
+def classify(lines, head=ROUTER_HEAD_LINES):
+    """The document type of OCR'd ``lines``, judged from the first lines and then the whole page; None if unknown."""
+    for window in (lines[:head], lines):
+        texts = [line.text for line in window]
+        scores = {doc_type: score(texts, doc_type) for doc_type in DOC_TYPE_MARKERS}
+        best = max(scores, key=scores.get)
+        if scores[best] and list(scores.values()).count(scores[best]) == 1:
+            return best
+    return None
+
+
+# -------------------- Routed Pipeline --------------------
+# Covers every type's parser, so changing any of them stops stale routed results being served.
+PARSER_VERSION = ".".join(f"{doc_type}{pipeline(doc_type).PARSER_VERSION}" for doc_type in sorted(DOC_TYPE_MARKERS))
+
+
+def reocr(doc_type, lines, image, load_full, timings):
+    """Re-read the fields the type's pipeline looks for where OCR was unsure of them."""
+    if doc_type is None:
+        return lines
+    return layout_fields.reocr_low_confidence(lines, pipeline(doc_type).LAYOUT_FIELDS, image, load_full, timings)
+
+
+def read_document(source, timings=None, on_line=None):
+    """OCR an upload (path or bytes) once and classify it; returns ``(doc_type, lines)``."""
+    if not pdf_pages.is_pdf(source):
+        image = preprocess.load_image(source, timings=timings)
+        lines = ocr_engine.read_lines(image, timings, on_line)
+        doc_type = classify(lines)
+        return doc_type, reocr(doc_type, lines, image, lambda: preprocess.load_image(source, max_side=0), timings)
+
+    # Render and OCR one page at a time, stopping once the document is recognized and fully parsed.
+    lines = []
+    doc_type = None
+    for page in pdf_pages.iter_pages(source):
+        image = preprocess.prepare(page, timings=timings)
+        page_lines = ocr_engine.read_lines(image, timings, on_line)
+        doc_type = classify(lines + page_lines)
+        lines.extend(reocr(doc_type, page_lines, image, lambda: page, timings))
+        if doc_type and pipeline(doc_type).is_complete(pipeline(doc_type).parse_lines(lines)):
+            break
+    return doc_type, lines
+
+
+def extract_document(source, filename, digest, on_line=None):
+    ocr_timings = {}
+
+    def parse():
+        doc_type, lines = read_document(source, ocr_timings, on_line)
+        return {"doc_type": doc_type, "details": pipeline(doc_type).parse_lines(lines) if doc_type else None}
+
+    extracted = result_cache.cached_parse("doc_router.extract_document", PARSER_VERSION, digest, parse)
+    tracing.record_timings("ocr", ocr_timings)
+    print(f"OCR timings for {filename} ({extracted['doc_type']}): {ocr_engine.format_timings(ocr_timings)}")
+    return extracted
+
+
+def validate_document(extracted, refresh=False, prefetches=None):
+    doc_type = extracted["doc_type"]
+    if doc_type is None:
+        return {"doc_type": None, "validation_message": "Could not tell what kind of certificate this is."}
+    prefetch = prefetches.get(doc_type) if prefetches else None
+    return dict(pipeline(doc_type).validate_document(extracted["details"], refresh, prefetch), doc_type=doc_type)
+
+
+def verify_document(progress, source, filename, digest, refresh=False):
+    # The type isn't known until OCR is done, so watch for either identifier; each starts its own registry's lookup.
+    prefetches = {
+        doc_type: speculative.LookupPrefetch(
+            IDENTIFIER_PATTERNS[doc_type],
+            lambda identifier, doc_type=doc_type: pipeline(doc_type).cached_registry_lookup(identifier, refresh))
+        for doc_type in IDENTIFIER_PATTERNS
+    }
+
+    def on_line(line):
+        for prefetch in prefetches.values():
+            prefetch.feed(line)
+
+    progress("ocr")
+    with tracing.span("verify.ocr"):
+        extracted = extract_document(source, filename, digest, on_line)
+    progress("registry_lookup")
+    with tracing.span("verify.registry_lookup"):
+        result = validate_document(extracted, refresh, prefetches)
+    # Recorded under the type's own pipeline, so re-verification can look it up again.
+    doc_type = extracted["doc_type"]
+    owner = pipeline(doc_type) if doc_type else sys.modules[__name__]
+    verification_store.save(owner, digest, filename, extracted["details"], result)
+    return result
+
+
+def verification_summary(result):
+    # Only used for documents that couldn't be classified; the others are summarized by their pipeline.
+    return {"doc_type": None, "status": result["validation_message"], "valid": False}
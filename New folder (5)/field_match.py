@@ -0,0 +1,178 @@
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+from difflib import SequenceMatcher
+
+import incorporation_fields
+
+# How similar, word for word, the distinctive part of two company names must be to count as the same company.
+MATCH_NAME_THRESHOLD = float(os.environ.get("MATCH_NAME_THRESHOLD", 0.9))
+
+# How a field is compared: as a company name, as a date, or as other free text (e.g. constitution of business).
+NAME = "name"
+DATE = "date"
+TEXT = "text"
+
+# Registries and certificates print dates in all of these; day-first, as is usual in India.
+DATE_FORMATS = ["%d %B %Y", "%d %b %Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%d-%b-%Y", "%d-%B-%Y",
+                "%B %d, %Y", "%b %d, %Y", "%d %B, %Y", "%d/%m/%y"]
+ORDINAL_SUFFIX_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b", re.IGNORECASE)
+
+# Abbreviations that only ever stand for one word in a company name, mapped to it. Not "TECH" for
+# "TECHNOLOGIES" and the like: the registry treats those as different names.
+NAME_SYNONYMS = {"PVT": "PRIVATE", "LTD": "LIMITED", "CO": "COMPANY", "&": "AND"}
+NAME_PREFIX_RE = re.compile(r"^\s*(?:M/S\.?|MESSRS\.?|THE)\s+", re.IGNORECASE)
+NAME_PHRASES = {"LIMITED LIABILITY PARTNERSHIP": "LLP", "ONE PERSON COMPANY": "OPC"}
+# Words that make up a name's legal form rather than tell companies apart; compared separately and exactly.
+LEGAL_FORM_WORDS = {"PRIVATE", "PUBLIC", "LIMITED", "LLP", "OPC", "COMPANY", "CORPORATION", "INCORPORATED", "INC"}
+# Characters OCR confuses with letters, read as those letters when words are compared.
+OCR_CONFUSABLES = str.maketrans("0158", "OISB")
+
+# The outcome for one field, with a reason that can be shown to the user as is.
+FieldMatch = namedtuple("FieldMatch", ["matched", "score", "ocr", "registry", "reason"])
+
+
+# -------------------- Normalization --------------------
+def canonical_date(text):
+    """The date written in ``text`` as a ``date``, whether in digits or in words; None if it can't be read."""
+    if not text:
+        return None
+    cleaned = " ".join(ORDINAL_SUFFIX_RE.sub(r"\1", str(text)).split())
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, date_format).date()
+        except ValueError:
+            pass
+    # "First day of January Two thousand nineteen", as printed on incorporation certificates.
+    in_words = incorporation_fields.parse_date_in_words(cleaned)
+    return datetime.strptime(in_words, "%d %B %Y").date() if in_words else None
+
+
+def normalize_name(text):
+    """Upper-case ``text`` without punctuation, "M/S" or "The", and with PVT/LTD/& etc. spelled one way."""
+    text = NAME_PREFIX_RE.sub("", str(text or "")).upper()
+    # Dots only join abbreviations ("L.L.P.", "PVT."); other punctuation separates words.
+    text = re.sub(r"[^\w&\s]", " ", text.replace(".", ""))
+    text = text.replace("&", " & ")
+    text = " ".join(NAME_SYNONYMS.get(word, word) for word in text.split())
+    for phrase, short in NAME_PHRASES.items():
+        text = re.sub(rf"\b{phrase}\b", short, text)
+    return text
+
+
+def normalize_text(text):
+    """Upper-case ``text`` with punctuation and runs of spaces turned into single spaces."""
+    return " ".join(re.sub(r"[^\w&]", " ", str(text or "").upper()).split())
+
+
+def split_legal_form(name):
+    """A normalized name's distinctive words, and its legal form: the legal-form words it ends with."""
+    words = name.split()
+    end = len(words)
+    while end and words[end - 1] in LEGAL_FORM_WORDS:
+        end -= 1
+    return words[:end], " ".join(words[end:])
+
+
+def similarity(a, b, threshold=0.0):
+    """Similarity ratio of two strings.
+
+    Cheap upper bounds are checked first, so pairs that can't reach
+    ``threshold`` are rejected without a full comparison; for those the
+    returned score is that upper bound.
+    """
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    bound = min(matcher.real_quick_ratio(), matcher.quick_ratio())
+    return matcher.ratio() if bound >= threshold else bound
+
+
+def word_similarity(words, other_words, threshold=0.0):
+    """The similarity of the least similar pair of words, paired in order or alphabetically; 0 if the counts differ."""
+    if len(words) != len(other_words):
+        return 0.0
+    best = 0.0
+    for left, right in ((words, other_words), (sorted(words), sorted(other_words))):
+        best = max(best, min((similarity(a.translate(OCR_CONFUSABLES), b.translate(OCR_CONFUSABLES), threshold)
+                              for a, b in zip(left, right)), default=1.0))
+    return best
+
+
+# -------------------- Field Comparison --------------------
+def missing(ocr, registry):
+    if not ocr:
+        return FieldMatch(False, 0.0, ocr, registry, "not found on the certificate")
+    if not registry:
+        return FieldMatch(False, 0.0, ocr, registry, "not found in the registry")
+    return None
+
+
+def compare_dates(ocr, registry):
+    result = missing(ocr, registry)
+    if result:
+        return result
+    ocr_date, registry_date = canonical_date(ocr), canonical_date(registry)
+    if ocr_date is None or registry_date is None:
+        return FieldMatch(False, 0.0, ocr, registry, f"could not read the date {ocr if ocr_date is None else registry!r}")
+    if ocr_date == registry_date:
+        return FieldMatch(True, 1.0, ocr, registry, f"same date ({ocr_date.isoformat()})")
+    return FieldMatch(False, 0.0, ocr, registry,
+                      f"different dates ({ocr_date.isoformat()} on the certificate, {registry_date.isoformat()} in the registry)")
+
+
+def compare_names(ocr, registry, threshold=MATCH_NAME_THRESHOLD):
+    result = missing(ocr, registry)
+    if result:
+        return result
+    normalized_ocr, normalized_registry = normalize_name(ocr), normalize_name(registry)
+    if normalized_ocr == normalized_registry:
+        return FieldMatch(True, 1.0, ocr, registry, "same after normalizing case, punctuation and suffixes")
+
+    # "PRIVATE LIMITED" is shared by most names and would outweigh a one-letter difference in the rest.
+    ocr_words, ocr_form = split_legal_form(normalized_ocr)
+    registry_words, registry_form = split_legal_form(normalized_registry)
+    if ocr_form != registry_form:
+        return FieldMatch(False, 0.0, ocr, registry,
+                          f"different legal form: {ocr_form or 'none'!r} vs. {registry_form or 'none'!r}")
+    if "".join(ocr_words).translate(OCR_CONFUSABLES) == "".join(registry_words).translate(OCR_CONFUSABLES):
+        return FieldMatch(True, 1.0, ocr, registry, "same apart from spacing and characters OCR confuses")
+    score = round(word_similarity(ocr_words, registry_words, threshold), 3)
+    if score >= threshold:
+        return FieldMatch(True, score, ocr, registry, f"every word similar ({score:.2f}, threshold {threshold:.2f})")
+    return FieldMatch(False, score, ocr, registry,
+                      f"different: {' '.join(ocr_words)!r} vs. {' '.join(registry_words)!r} "
+                      f"({score:.2f}, threshold {threshold:.2f})")
+
+
+def compare_text(ocr, registry):
+    result = missing(ocr, registry)
+    if result:
+        return result
+    normalized_ocr, normalized_registry = normalize_text(ocr), normalize_text(registry)
+    if normalized_ocr == normalized_registry:
+        return FieldMatch(True, 1.0, ocr, registry, "same after normalizing case and punctuation")
+    return FieldMatch(False, 0.0, ocr, registry, f"different: {normalized_ocr!r} vs. {normalized_registry!r}")
+
+
+def compare(checks, threshold=MATCH_NAME_THRESHOLD):
+    """Compare ``(field, kind, ocr_value, registry_value)`` checks; returns ``{field: FieldMatch}``."""
+    matches = {}
+    for field, kind, ocr, registry in checks:
+        if kind == DATE:
+            matches[field] = compare_dates(ocr, registry)
+        elif kind == TEXT:
+            matches[field] = compare_text(ocr, registry)
+        else:
+            matches[field] = compare_names(ocr, registry, threshold)
+    return matches
+
+
+def all_matched(matches):
+    return all(match.matched for match in matches.values())
+
+
+def explain(matches):
+    """``matches`` as plain dicts, for job results and templates."""
+    return {field: match._asdict() for field, match in matches.items()}
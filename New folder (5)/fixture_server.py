@@ -0,0 +1,58 @@
+import argparse
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "registry")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves ``fixtures/registry/<source>/<identifier>.html`` for ``/<source>/.../<identifier>``.
+
+    Point a registry source at it with e.g.
+    ``ZAUBACORP_BASE_URL=http://127.0.0.1:8765/zaubacorp``. Sources listed in
+    ``defaults`` answer identifiers without a fixture of their own with that
+    source's default identifier's page, so any corpus can be looked up offline.
+    """
+
+    defaults = {}
+
+    def do_GET(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) < 2:
+            self.send_error(404)
+            return
+        fixture = os.path.join(FIXTURE_DIR, parts[0], os.path.basename(parts[-1]) + ".html")
+        if not os.path.isfile(fixture) and parts[0] in self.defaults:
+            fixture = os.path.join(FIXTURE_DIR, parts[0], self.defaults[parts[0]] + ".html")
+        if not os.path.isfile(fixture):
+            self.send_error(404, f"No fixture for {parts[0]} {parts[-1]}")
+            return
+        with open(fixture, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(host="127.0.0.1", port=0, defaults=None):
+    """Start the stand-in registry in a background thread and return ``(server, base_url)``."""
+    handler = type("Handler", (FixtureHandler,), {"defaults": dict(defaults or {})})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded registry pages locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FixtureHandler)
+    print(f"Serving {FIXTURE_DIR} on http://127.0.0.1:{args.port}")
+    server.serve_forever()
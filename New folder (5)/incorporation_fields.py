@@ -0,0 +1,134 @@
+import re
+from collections import namedtuple
+
+# Bump whenever a field spec or the OCR preprocessing changes so cached OCR results are re-parsed.
+PARSER_VERSION = "4"
+
+# -------------------- Number Words --------------------
+UNITS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+         "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+SCALES = {"hundred": 100, "thousand": 1000}
+NUMBER_WORDS = {word: value for value, word in enumerate(UNITS)}
+NUMBER_WORDS.update({word: value * 10 for value, word in enumerate(TENS) if word})
+
+ORDINAL_UNITS = ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth",
+                 "eleventh", "twelfth", "thirteenth", "fourteenth", "fifteenth", "sixteenth", "seventeenth",
+                 "eighteenth", "nineteenth"]
+ORDINALS = {word: value for value, word in enumerate(ORDINAL_UNITS, start=1)}
+ORDINALS.update({"twentieth": 20, "thirtieth": 30})
+ORDINALS.update({f"twenty{word}": 20 + value for value, word in enumerate(ORDINAL_UNITS[:9], start=1)})
+ORDINALS["thirtyfirst"] = 31
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+
+DAY_RE = re.compile(
+    r"\b(twenty[\s-]?(?:" + "|".join(ORDINAL_UNITS[:9]) + r")|thirty[\s-]?first|"
+    + "|".join(sorted(ORDINALS, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+MONTH_RE = re.compile(r"\b(" + "|".join(MONTHS) + r")\b", re.IGNORECASE)
+YEAR_DIGITS_RE = re.compile(r"\b(\d{4})\b")
+WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+def words_to_number(words):
+    """Parse cardinal number words, e.g. "two thousand and twenty-one" -> 2021; None if any word is unknown."""
+    total = current = 0
+    tokens = [token for token in re.split(r"[\s-]+", words.lower()) if token and token != "and"]
+    if not tokens:
+        return None
+    for token in tokens:
+        if token in NUMBER_WORDS:
+            current += NUMBER_WORDS[token]
+        elif token in SCALES:
+            scale = SCALES[token]
+            if scale == 100:
+                current = (current or 1) * scale
+            else:
+                total += (current or 1) * scale
+                current = 0
+        else:
+            return None
+    return total + current
+
+
+def leading_number_words(text):
+    """The first run of number words in ``text``, e.g. "Two thousand nineteen" from ", Two thousand nineteen under"."""
+    words = []
+    for word in WORD_RE.findall(text):
+        lowered = word.lower()
+        if lowered in NUMBER_WORDS or lowered in SCALES or (words and lowered == "and"):
+            words.append(lowered)
+        elif words:
+            break
+    return " ".join(words)
+
+
+def parse_date_in_words(date_in_words):
+    """"First day of January Two thousand nineteen" -> "01 January 2019"; None when incomplete."""
+    day_match = DAY_RE.search(date_in_words)
+    month_match = MONTH_RE.search(date_in_words)
+    if not day_match or not month_match:
+        return None
+    day = ORDINALS[re.sub(r"[\s-]", "", day_match.group(1).lower())]
+
+    rest = date_in_words[month_match.end():]
+    year_match = YEAR_DIGITS_RE.search(rest)
+    if year_match:
+        year = int(year_match.group(1))
+    else:
+        year = words_to_number(leading_number_words(rest))
+    if not year or year < 1800:
+        return None
+    return f"{day:02d} {month_match.group(1).capitalize()} {year}"
+
+
+# -------------------- Field Specs --------------------
+def strip_identifier(value):
+    # OCR keeps the sentence's full stop attached to an identifier at the end of a sentence.
+    return value.strip().rstrip(".,;:")
+
+
+FieldSpec = namedtuple("FieldSpec", ["name", "pattern", "transform", "missing"])
+
+# Each pattern captures a group named after its field. Trailing anchors that
+# start another field's label are lookaheads so that field can still match.
+FIELD_SPECS = [
+    FieldSpec("company_name", r"hereby certify that (?P<company_name>.+?) is (?=incorporated on)",
+              str.upper, "COMPANY NAME NOT FOUND"),
+    FieldSpec("date_of_incorporation", r"incorporated on (?P<date_of_incorporation>.+?) under the Companies Act",
+              parse_date_in_words, "Date not found"),
+    FieldSpec("llpin", r"Identity Number of the company is\s*(?P<llpin>\S+)",
+              strip_identifier, "LLPIN / CIN not found"),
+    # Covers "Permanent Account Number(PAN) of", "(PAN)of" and "(PAN) of" as OCR splits them.
+    FieldSpec("pan", r"PAN\)\s*of the company is\s*(?P<pan>\S+)",
+              strip_identifier, "PAN not found"),
+    FieldSpec("digital_signature_name", r"Digital Signature Certificate\s*(?P<digital_signature_name>.+?)\s*For and on behalf of",
+              str.strip, "Digital Signature Name not found"),
+]
+
+FIELD_NAMES = [spec.name for spec in FIELD_SPECS]
+NOT_FOUND = {spec.missing for spec in FIELD_SPECS}
+_SPECS_BY_NAME = {spec.name: spec for spec in FIELD_SPECS}
+FIELDS_RE = re.compile("|".join(f"(?:{spec.pattern})" for spec in FIELD_SPECS), re.IGNORECASE)
+
+
+def extract_fields(extracted_text):
+    """Pull every field out of the joined OCR text in a single scan; missing fields get their placeholder."""
+    fields = {}
+    for match in FIELDS_RE.finditer(extracted_text):
+        name = match.lastgroup
+        if name in fields:
+            continue
+        value = _SPECS_BY_NAME[name].transform(match.group(name))
+        if value:
+            fields[name] = value
+        if len(fields) == len(FIELD_SPECS):
+            break
+    return {spec.name: fields.get(spec.name, spec.missing) for spec in FIELD_SPECS}
+
+
+def parse_certificate_text(extracted_text):
+    """The fields as the ``(company_name, date_of_incorporation, llpin, pan, digital_signature_name)`` tuple the apps use."""
+    fields = extract_fields(extracted_text)
+    return tuple(fields[name] for name in FIELD_NAMES)
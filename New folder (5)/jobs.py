@@ -0,0 +1,204 @@
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+# Finished jobs are kept this long so clients can still fetch their result.
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 60 * 60))
+# SQLite file shared by the worker processes of a multi-process server; empty keeps jobs in memory only.
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "")
+JOB_STORE_POLL_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.timings = None
+        self.version = 0
+        self.created_at = self.updated_at = time.time()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self, timings=False):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "result": self.result if self.status == DONE else None,
+        }
+        if timings:
+            data["timings"] = self.timings
+        return data
+
+    @classmethod
+    def from_dict(cls, data, version, updated_at):
+        job = cls.__new__(cls)
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.stage = data["stage"]
+        job.error = data["error"]
+        job.result = data["result"]
+        job.timings = data.get("timings")
+        job.version = version
+        job.created_at = job.updated_at = updated_at
+        return job
+
+
+# -------------------- Shared Store --------------------
+class JobStore:
+    """Job state in SQLite, so whichever worker process a status request lands on can answer it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, state TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        # One connection per thread and per process; a connection must not be used across a fork.
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.db.execute("PRAGMA journal_mode=WAL")
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def save(self, job):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO jobs (id, state, version, updated_at) VALUES (?, ?, ?, ?)",
+            (job.id, json.dumps(job.to_dict(timings=True)), job.version, job.updated_at),
+        )
+
+    def load(self, job_id):
+        row = self._connect().execute(
+            "SELECT state, version, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_dict(json.loads(row[0]), row[1], row[2]) if row else None
+
+    def prune(self, cutoff):
+        self._connect().execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,))
+
+
+# -------------------- Job Manager --------------------
+class JobManager:
+    """Runs verification work on a thread pool and tracks its progress.
+
+    The work function is called as ``fn(progress, *args)`` where
+    ``progress(stage)`` records which step the job is on; its return value
+    becomes the job result.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, retention=JOB_RETENTION, store_path=JOB_STORE_PATH):
+        self.retention = retention
+        self.store = JobStore(store_path) if store_path else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._changed = threading.Condition()
+
+    def _update(self, job, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+            job.updated_at = time.time()
+            if self.store is not None:
+                self.store.save(job)
+            self._changed.notify_all()
+
+    def _run(self, job, fn, args):
+        tracing.record("job.queue_wait", time.time() - job.created_at)
+        self._update(job, status=RUNNING)
+        trace = tracing.current_trace()
+        try:
+            result = fn(lambda stage: self._update(job, stage=stage), *args)
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self._update(job, status=FAILED, error=str(e), timings=trace.breakdown() if trace else None)
+        else:
+            self._update(job, status=DONE, result=result, timings=trace.breakdown() if trace else None)
+
+    def submit(self, fn, *args):
+        self._prune()
+        job = Job()
+        with self._changed:
+            self._jobs[job.id] = job
+            if self.store is not None:
+                self.store.save(job)
+        # Run in a copy of the caller's context so the job's spans land in the request's trace.
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._changed:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+                del self._jobs[job_id]
+            if self.store is not None:
+                self.store.prune(cutoff)
+
+    def shutdown(self):
+        """Finish queued and running jobs; called when a worker process is asked to exit."""
+        self._executor.shutdown(wait=True)
+
+    def wait_for_change(self, job, version, timeout=15):
+        if job.id not in self._jobs and self.store is not None:
+            return self._poll_store(job, version, timeout)
+        with self._changed:
+            self._changed.wait_for(lambda: job.version != version, timeout=timeout)
+            return job.version
+
+    def _poll_store(self, job, version, timeout):
+        # A job running in another worker process only changes in the shared store.
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            stored = self.store.load(job.id)
+            if stored is not None and stored.version != version:
+                job.__dict__.update(stored.__dict__)
+                break
+            time.sleep(JOB_STORE_POLL_INTERVAL)
+        return job.version
+
+    def events(self, job):
+        """Server-sent events for a job, ending once it has finished."""
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield sse_event(job)
+                if job.finished:
+                    return
+            elif self.wait_for_change(job, version) == version:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+
+
+def sse_event(job):
+    return f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+
+jobs = JobManager()
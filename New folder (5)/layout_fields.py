@@ -0,0 +1,157 @@
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+import ocr_engine
+import tracing
+
+# Fields read with a lower recognition score than this are re-read from a high-resolution crop.
+OCR_FIELD_MIN_CONFIDENCE = float(os.environ.get("OCR_FIELD_MIN_CONFIDENCE", 0.85))
+# Extra margin around a field's box when it is re-read, as a fraction of the line height.
+REOCR_PADDING = 0.3
+# How far below its label a value may sit, in label heights.
+MAX_ROWS_BELOW = 3
+
+# A field to find: its name, the label text(s) printed next to it, and optionally the shape its value must have.
+LabelSpec = namedtuple("LabelSpec", ["name", "labels", "pattern"])
+# A field that was found: its value, the recognition score of the line it came from and that line's index.
+Field = namedtuple("Field", ["value", "score", "line"])
+
+
+def compact(text):
+    return re.sub(r"\s+", "", text).lower()
+
+
+# -------------------- Geometry --------------------
+def bounds(box):
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def same_row(label, other):
+    """Whether ``other``'s vertical centre falls within ``label``'s line."""
+    _, top, _, bottom = bounds(label)
+    _, other_top, _, other_bottom = bounds(other)
+    return top <= (other_top + other_bottom) / 2 <= bottom
+
+
+def right_of(label, other):
+    """Horizontal gap between the end of ``label`` and the start of ``other``; None if ``other`` isn't to its right."""
+    _, _, right, _ = bounds(label)
+    other_left = bounds(other)[0]
+    return other_left - right if other_left >= right - 2 else None
+
+
+def below(label, other):
+    """Vertical gap from ``label`` down to ``other`` when they overlap horizontally and it's close enough; else None."""
+    left, top, right, bottom = bounds(label)
+    other_left, other_top, other_right, _ = bounds(other)
+    gap = other_top - bottom
+    if gap < -2 or gap > MAX_ROWS_BELOW * (bottom - top) or other_right < left or other_left > right + (right - left):
+        return None
+    return gap
+
+
+# -------------------- Key/Value Pairing --------------------
+def label_match(text, labels):
+    """The text after the first of ``labels`` found in ``text`` (ignoring case and spacing); None if there is none."""
+    squeezed = compact(text)
+    for label in labels:
+        position = squeezed.find(compact(label))
+        if position < 0:
+            continue
+        # Map the end of the label in the compacted text back to the original text.
+        end = position + len(compact(label))
+        seen = 0
+        for index, char in enumerate(text):
+            if not char.isspace():
+                seen += 1
+            if seen == end:
+                return text[index + 1:]
+    return None
+
+
+def candidate_value(text, spec, all_labels):
+    text = text.strip(" :-.")
+    if spec.pattern is not None:
+        match = spec.pattern.search(text)
+        return match.group(0) if match else None
+    # A neighbouring field's label is not a value.
+    if not text or label_match(text, all_labels) is not None:
+        return None
+    return text
+
+
+def find_field(lines, spec, all_labels):
+    for index, line in enumerate(lines):
+        rest = label_match(line.text, spec.labels)
+        if rest is None:
+            continue
+        value = candidate_value(rest, spec, all_labels)
+        if value:
+            return Field(value, line.score, index)
+
+        # Nothing after the label on its own line: try the nearest line to its right, then the nearest below it.
+        others = [(i, other) for i, other in enumerate(lines) if i != index]
+        right = sorted((gap, i) for i, other in others if same_row(line.box, other.box)
+                       for gap in [right_of(line.box, other.box)] if gap is not None)
+        down = sorted((gap, i) for i, other in others if not same_row(line.box, other.box)
+                      for gap in [below(line.box, other.box)] if gap is not None)
+        for _, i in right + down:
+            value = candidate_value(lines[i].text, spec, all_labels)
+            if value:
+                return Field(value, lines[i].score, i)
+    return None
+
+
+def extract(lines, specs):
+    """Pair each spec's label with the value printed beside or under it; ``{name: Field or None}``."""
+    all_labels = [label for spec in specs for label in spec.labels]
+    return {spec.name: find_field(lines, spec, all_labels) for spec in specs}
+
+
+def values(fields):
+    return {name: field.value if field else "" for name, field in fields.items()}
+
+
+# -------------------- Targeted Re-OCR --------------------
+def scaled_box(box, scale, padding):
+    points = np.array(box, dtype=np.float32) * scale
+    left, top, right, bottom = bounds(points)
+    pad = (bottom - top) * padding
+    return [[left - pad, top - pad], [right + pad, top - pad], [right + pad, bottom + pad], [left - pad, bottom + pad]]
+
+
+def reocr_low_confidence(lines, specs, image, load_full=None, timings=None, min_score=OCR_FIELD_MIN_CONFIDENCE):
+    """Re-read the lines holding low-confidence fields from a padded, full-resolution crop.
+
+    ``image`` is the image ``lines`` were read from; ``load_full``, if given,
+    returns the same page before downscaling and is only called when some
+    field needs re-reading. A line is replaced when the re-read scores
+    higher. Returns the (possibly updated) lines.
+    """
+    if not specs:
+        return lines
+    weak = sorted({field.line for field in extract(lines, specs).values()
+                   if field is not None and field.score < min_score})
+    if not weak:
+        return lines
+
+    with tracing.span("ocr.reocr"):
+        full = load_full() if load_full is not None else image
+        scale = full.shape[1] / image.shape[1]
+        height, width = full.shape[:2]
+        crops = []
+        for index in weak:
+            box = np.clip(scaled_box(lines[index].box, scale, REOCR_PADDING), 0, [width - 1, height - 1])
+            crops.append(ocr_engine.crop_line(full, box))
+        recognized = ocr_engine.recognize(crops, timings)
+
+    lines = list(lines)
+    for index, (text, score) in zip(weak, recognized):
+        if score > lines[index].score:
+            lines[index] = lines[index]._replace(text=text, score=score)
+    return lines
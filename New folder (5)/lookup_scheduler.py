@@ -0,0 +1,205 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import registry_http
+import scraper_pool
+import tracing
+
+# Sustained lookups per second sent to each registry, and how many may go out back to back.
+LOOKUP_RATE = float(os.environ.get("LOOKUP_RATE", 1.0))
+LOOKUP_BURST = int(os.environ.get("LOOKUP_BURST", 3))
+# A lookup that would wait longer than this for its turn is turned away instead.
+LOOKUP_MAX_WAIT = float(os.environ.get("LOOKUP_MAX_WAIT", 10))
+LOOKUP_RETRIES = int(os.environ.get("LOOKUP_RETRIES", 2))
+LOOKUP_BACKOFF = float(os.environ.get("LOOKUP_BACKOFF", 0.5))
+# A lookup gives up once it has been running this long, even in the middle of an attempt. By default that
+# is as long as one slow attempt can take: the HTTP try, waiting for a browser, the page load and the
+# scraper's two element waits.
+LOOKUP_DEADLINE = float(os.environ.get("LOOKUP_DEADLINE", registry_http.REGISTRY_HTTP_TIMEOUT * 2
+                                       + scraper_pool.BROWSER_CHECKOUT_TIMEOUT
+                                       + scraper_pool.BROWSER_PAGE_LOAD_TIMEOUT
+                                       + scraper_pool.BROWSER_WAIT_TIMEOUT * 2))
+# Consecutive failed attempts that open a source's circuit, and how long it stays open.
+LOOKUP_BREAKER_THRESHOLD = int(os.environ.get("LOOKUP_BREAKER_THRESHOLD", 5))
+LOOKUP_BREAKER_COOLDOWN = float(os.environ.get("LOOKUP_BREAKER_COOLDOWN", 60))
+# Threads running fetch attempts for all sources; rate limits and deadlines keep far fewer than this in flight.
+LOOKUP_ATTEMPT_WORKERS = 32
+
+
+class RegistryUnavailable(Exception):
+    pass
+
+
+# -------------------- Rate Limit --------------------
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average and up to ``burst`` at once."""
+
+    def __init__(self, rate=LOOKUP_RATE, burst=LOOKUP_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Take a token and return how long to wait before using it; None, taking nothing, if that exceeds ``max_wait``."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens go negative while callers are queued, so each reservation waits behind the earlier ones.
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+# -------------------- Circuit Breaker --------------------
+class CircuitBreaker:
+    """Fails fast after ``threshold`` consecutive failures, letting one trial call through every ``cooldown`` seconds."""
+
+    def __init__(self, threshold=LOOKUP_BREAKER_THRESHOLD, cooldown=LOOKUP_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Half-open: this caller is the trial, everyone else keeps failing fast until it reports back.
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+
+# -------------------- Scheduler --------------------
+class LookupScheduler:
+    """Runs one registry source's lookups: deduplicated, rate-limited, retried and behind a circuit breaker.
+
+    Concurrent lookups of the same identifier share one call to ``fetch``.
+    Exceptions from ``fetch`` are retried with jittered exponential backoff;
+    a lookup that still fails, runs past ``deadline`` (an attempt still
+    running then is abandoned), would queue for longer than ``max_wait``, or
+    hits an open circuit, raises ``RegistryUnavailable``. An abandoned
+    attempt reports to the circuit breaker once it finishes. A ``None`` result
+    means the registry has no such company and counts as a success.
+    """
+
+    def __init__(self, source, rate=LOOKUP_RATE, burst=LOOKUP_BURST, max_wait=LOOKUP_MAX_WAIT,
+                 retries=LOOKUP_RETRIES, backoff=LOOKUP_BACKOFF, deadline=LOOKUP_DEADLINE,
+                 breaker_threshold=LOOKUP_BREAKER_THRESHOLD, breaker_cooldown=LOOKUP_BREAKER_COOLDOWN):
+        self.source = source
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, identifier, fetch):
+        with self._lock:
+            future = self._in_flight.get(identifier)
+            leader = future is None
+            if leader:
+                future = self._in_flight[identifier] = Future()
+        if not leader:
+            with tracing.span(f"registry.coalesced.{self.source}"):
+                return future.result()
+
+        try:
+            future.set_result(self._fetch(identifier, fetch))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[identifier]
+        return future.result()
+
+    def _fetch(self, identifier, fetch):
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise RegistryUnavailable(f"{self.source} is failing, not looked up until it recovers")
+            delay = self.bucket.reserve(min(self.max_wait, self.deadline - (time.monotonic() - started)))
+            if delay is None:
+                raise RegistryUnavailable(f"{self.source} rate limit reached, lookup queue is full")
+            if delay:
+                with tracing.span(f"registry.rate_limit_wait.{self.source}"):
+                    time.sleep(delay)
+            attempt_future = _attempts.submit(contextvars.copy_context().run, fetch, identifier)
+            if not wait([attempt_future], timeout=max(0.0, self.deadline - (time.monotonic() - started))).done:
+                # Nobody waits for the abandoned attempt; it returns its browser to the pool when it finishes,
+                # and only counts against the source if it then turns out to have failed.
+                attempt_future.add_done_callback(self._settle)
+                print(f"Lookup of {identifier} on {self.source} timed out after {self.deadline:.0f}s")
+                raise RegistryUnavailable(f"{self.source} did not answer within {self.deadline:.0f} seconds")
+            try:
+                result = attempt_future.result()
+            except Exception as e:
+                self.breaker.failed()
+                print(f"Lookup of {identifier} on {self.source} failed (attempt {attempt + 1}): {e!r}")
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if attempt == self.retries or time.monotonic() - started + delay > self.deadline:
+                    raise RegistryUnavailable(f"{self.source} lookup failed: {e}") from e
+                time.sleep(delay)
+            else:
+                self.breaker.succeeded()
+                return result
+
+    def _settle(self, attempt_future):
+        if attempt_future.exception() is None:
+            self.breaker.succeeded()
+        else:
+            self.breaker.failed()
+
+    def snapshot(self):
+        return {"in_flight": len(self._in_flight), "consecutive_failures": self.breaker.failures,
+                "circuit_open": self.breaker.is_open}
+
+
+_attempts = ThreadPoolExecutor(max_workers=LOOKUP_ATTEMPT_WORKERS, thread_name_prefix="registry-lookup")
+
+SCHEDULERS = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler(source):
+    """The scheduler of a registry source, created with the module defaults on first use."""
+    with _schedulers_lock:
+        if source not in SCHEDULERS:
+            SCHEDULERS[source] = LookupScheduler(source)
+        return SCHEDULERS[source]
+
+
+def lookup(source, identifier, fetch):
+    return scheduler(source).lookup(identifier, fetch)
+
+
+def snapshot():
+    return {source: scheduler.snapshot() for source, scheduler in SCHEDULERS.items()}
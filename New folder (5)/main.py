@@ -1,20 +1,31 @@
 import os
 import re
-import time
-from flask import Flask, render_template, request, redirect
-from paddleocr import PaddleOCR
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import sys
+import tempfile
+import zipfile
+from flask import Flask, Response, abort, jsonify, render_template, request, redirect, stream_with_context, url_for
+
+import batch
+import field_match
+import incorporation_fields
+import jobs
+import layout_fields
+import lookup_scheduler
+import ocr_engine
+import pdf_pages
+import preprocess
+import registry_http
+import result_cache
+import scraper_pool
+import speculative
+import tracing
+import upload_store
+import verification_store
+import warmup
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png'}
+app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png', 'pdf'}
+upload_store.configure_flask(app)
 
 
 # -------------------- File Validation --------------------
@@ -23,92 +34,181 @@ def allowed_file(filename):
 
 
 # -------------------- OCR Extraction --------------------
-def extract_details_from_image(img_path):
-    ocr = PaddleOCR(use_angle_cls=True, lang='en')
-    result = ocr.ocr(img_path)
-    extracted_text = " ".join([line[1][0] for line in result[0]])
-
-    # Extract company name
-    company_name_match = re.search(r"hereby certify that (.+?) is incorporated on", extracted_text, re.IGNORECASE)
-    company_name = company_name_match.group(1).upper() if company_name_match else "COMPANY NAME NOT FOUND"
-
-    # Extract incorporation date
-    date_in_words_match = re.search(r"incorporated on (.+?) under the Companies Act", extracted_text, re.IGNORECASE)
-    if date_in_words_match:
-        date_in_words = date_in_words_match.group(1)
-        day_map = {
-            "First": "01", "Second": "02", "Third": "03", "Fourth": "04", "Fifth": "05", "Sixth": "06",
-            "Seventh": "07", "Eighth": "08", "Ninth": "09", "Tenth": "10", "Eleventh": "11", "Twelfth": "12",
-            "Thirteenth": "13", "Fourteenth": "14", "Fifteenth": "15", "Sixteenth": "16", "Seventeenth": "17",
-            "Eighteenth": "18", "Nineteenth": "19", "Twentieth": "20", "Twenty-first": "21", "Twenty-second": "22",
-            "Twenty-third": "23", "Twenty-fourth": "24", "Twenty-fifth": "25", "Twenty-sixth": "26",
-            "Twenty-seventh": "27", "Twenty-eighth": "28", "Twenty-ninth": "29", "Thirtieth": "30", "Thirty-first": "31"
-        }
-        month_map = {
-            "January": "January", "February": "February", "March": "March", "April": "April", "May": "May", "June": "June",
-            "July": "July", "August": "August", "September": "September", "October": "October", "November": "November", "December": "December"
-        }
-        day_match = re.search(r"(" + "|".join(day_map.keys()) + ")", date_in_words)
-        month_match = re.search(r"(" + "|".join(month_map.keys()) + ")", date_in_words)
-        year_match = re.search(r"Two thousand (\w+)", date_in_words, re.IGNORECASE)
-        if day_match and month_match and year_match:
-            day = day_map[day_match.group(1)]
-            month = month_map[month_match.group(1)]
-            year_word = year_match.group(1).lower()
-            year_lookup = {"nineteen": "2019", "eighteen": "2018", "twenty": "2020"}
-            year = year_lookup.get(year_word, "20" + year_word)
-            date_of_incorporation = f"{day} {month} {year}"
-        else:
-            date_of_incorporation = "Date not found"
-    else:
-        date_of_incorporation = "Date not found"
+# Lines re-read at high resolution when OCR is unsure of them; the CIN is what the registry is searched by.
+LAYOUT_FIELDS = [
+    layout_fields.LabelSpec("llpin", ["Identity Number of the company is"], re.compile(r"\S+")),
+    layout_fields.LabelSpec("pan", ["(PAN) of the company is"], re.compile(r"\S+")),
+]
+
+
+def ocr_text(img, timings=None, on_line=None, load_full=None):
+    """OCR an image's text; ``load_full`` returns it before downscaling, for re-reading uncertain fields."""
+    lines = ocr_engine.read_lines(img, timings, on_line)
+    lines = layout_fields.reocr_low_confidence(lines, LAYOUT_FIELDS, img, load_full, timings)
+    return " ".join(line.text for line in lines)
+
+
+def parse_text(extracted_text):
+    with tracing.span("parse.incorporation_fields"):
+        return incorporation_fields.parse_certificate_text(extracted_text)
+
 
-    # LLPIN / CIN
-    llpin_match = re.search(r"Identity Number of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    llpin = llpin_match.group(1) if llpin_match else "LLPIN / CIN not found"
+def extract_details_from_image(source, timings=None, on_line=None):
+    image = preprocess.load_image(source, timings=timings)
+    return parse_text(ocr_text(image, timings, on_line, lambda: preprocess.load_image(source, max_side=0)))
 
-    # PAN
-    pan_match = re.search(r"PAN\) of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    pan = pan_match.group(1) if pan_match else "PAN not found"
 
-    # Digital Signature Name
-    ds_match = re.search(r"Digital Signature Certificate\s*(.+?)\s*For and on behalf of", extracted_text, re.IGNORECASE)
-    digital_signature_name = ds_match.group(1).strip() if ds_match else "Digital Signature Name not found"
+def parse_lines(lines):
+    return parse_text(" ".join(line.text for line in lines))
 
-    return company_name, date_of_incorporation, llpin, pan, digital_signature_name
+
+def is_complete(details):
+    return not any(value in incorporation_fields.NOT_FOUND for value in details)
+
+
+def extract_details_from_pdf(source, timings=None, on_line=None):
+    # Render and OCR one page at a time, stopping once every field has been found.
+    extracted_text = ""
+    details = incorporation_fields.parse_certificate_text(extracted_text)
+    for page in pdf_pages.iter_pages(source):
+        page_text = ocr_text(preprocess.prepare(page, timings=timings), timings, on_line, lambda: page)
+        extracted_text = f"{extracted_text} {page_text}".strip()
+        details = parse_text(extracted_text)
+        if is_complete(details):
+            break
+    return details
+
+
+def extract_details(source, timings=None, on_line=None):
+    """OCR an upload given as a file path or as its bytes."""
+    if pdf_pages.is_pdf(source):
+        return extract_details_from_pdf(source, timings, on_line)
+    return extract_details_from_image(source, timings, on_line)
 
 
 # -------------------- Selenium Scraper --------------------
 def get_gst_details(CIN):
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.get("https://www.zaubacorp.com")
+    # Selenium is only loaded once a lookup actually needs the browser.
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
     try:
-        input_field = driver.find_element(By.ID, 'searchid')
-        input_field.send_keys(CIN)
-        input_field.send_keys(Keys.RETURN)
+        with scraper_pool.pool.session() as driver:
+            with tracing.span("browser.page_load.zaubacorp"):
+                driver.get("https://www.zaubacorp.com")
+
+            input_field = driver.find_element(By.ID, 'searchid')
+            input_field.send_keys(CIN)
+            input_field.send_keys(Keys.RETURN)
 
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p"))
-        )
+            with tracing.span("browser.wait.company_details"):
+                try:
+                    WebDriverWait(driver, scraper_pool.BROWSER_WAIT_TIMEOUT).until(
+                        EC.presence_of_element_located((By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p"))
+                    )
+                except TimeoutException:
+                    # The page loaded but no company details appeared: zaubacorp has no such CIN.
+                    # That is an answer, not a registry failure to retry or hold against the source.
+                    print(f"No company found on zaubacorp for {CIN}")
+                    return None
 
-        company_name = driver.find_element(By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p").text
-        date_of_incorp = driver.find_element(By.XPATH, "//td[p[text()='Date of Incorporation']]/following-sibling::td/p").text
+            company_name = driver.find_element(By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p").text
+            date_of_incorp = driver.find_element(By.XPATH, "//td[p[text()='Date of Incorporation']]/following-sibling::td/p").text
 
     except Exception as e:
         print("Error fetching GST details:", e)
-        driver.quit()
-        return None
+        # A browser or pool failure: raised so the lookup scheduler retries it and counts it against the registry.
+        raise
 
-    driver.quit()
     return {"Company Name": company_name, "Date of Incorporation": date_of_incorp}
 
 
+def lookup_registry(CIN):
+    # Plain HTTP first; the browser scrape only runs when that page can't be read directly.
+    return registry_http.lookup("zaubacorp", CIN, fallback=get_gst_details)
+
+
+def cached_registry_lookup(CIN, refresh=False):
+    return result_cache.cached_lookup("zaubacorp", CIN, lookup_registry, refresh=refresh)
+
+
+# -------------------- Verification --------------------
+PARSER_VERSION = incorporation_fields.PARSER_VERSION
+
+
+def extract_document(source, filename, digest, on_line=None):
+    ocr_timings = {}
+    details = result_cache.cached_parse(
+        "main.extract_details_from_image", PARSER_VERSION, digest,
+        lambda: extract_details(source, ocr_timings, on_line))
+    tracing.record_timings("ocr", ocr_timings)
+    app.logger.info("OCR timings for %s: %s", filename, ocr_engine.format_timings(ocr_timings))
+    return details
+
+
+def validate_document(details, refresh=False, prefetch=None):
+    company_name, date_of_incorp, llpin, pan, ds_name = details
+    validation_status = "CIN not found in OCR"
+    gst_details = None
+    field_matches = None
+
+    if llpin != "LLPIN / CIN not found":
+        try:
+            if prefetch is not None:
+                gst_details = prefetch.resolve(llpin)
+            else:
+                gst_details = cached_registry_lookup(llpin, refresh)
+        except lookup_scheduler.RegistryUnavailable as e:
+            app.logger.warning("Registry lookup for %s unavailable: %s", llpin, e)
+            validation_status = "Registry unavailable, please try again later."
+        else:
+            if gst_details:
+                matches = field_match.compare([
+                    ("company_name", field_match.NAME, company_name, gst_details["Company Name"]),
+                    ("date_of_incorporation", field_match.DATE, date_of_incorp, gst_details["Date of Incorporation"]),
+                ])
+                validation_status = "Valid" if field_match.all_matched(matches) else "Not Valid"
+                field_matches = field_match.explain(matches)
+            else:
+                validation_status = "Failed to fetch GST details."
+
+    return dict(company_name=company_name,
+                date_of_incorporation=date_of_incorp,
+                llpin=llpin,
+                pan=pan,
+                digital_signature_name=ds_name,
+                validation_status=validation_status,
+                field_matches=field_matches,
+                gst_details=gst_details)
+
+
+def verify_document(progress, source, filename, digest, refresh=False):
+    # The registry lookup starts as soon as a CIN is recognized, while OCR carries on with the rest of the page.
+    prefetch = speculative.LookupPrefetch(speculative.CIN_RE, lambda CIN: cached_registry_lookup(CIN, refresh))
+    progress("ocr")
+    with tracing.span("verify.ocr"):
+        details = extract_document(source, filename, digest, prefetch.feed)
+    progress("registry_lookup")
+    with tracing.span("verify.registry_lookup"):
+        result = validate_document(details, refresh, prefetch)
+    verification_store.save(sys.modules[__name__], digest, filename, details, result)
+    return result
+
+
+def verification_summary(result):
+    """The identifiers, status and registry snapshot of a ``validate_document`` result, for ``verification_store``."""
+    return dict(doc_type="incorporation",
+                cin=None if result["llpin"] in incorporation_fields.NOT_FOUND else result["llpin"],
+                pan=None if result["pan"] in incorporation_fields.NOT_FOUND else result["pan"],
+                status=result["validation_status"],
+                valid=result["validation_status"] == "Valid",
+                registry=result["gst_details"],
+                field_matches=result["field_matches"])
+
+
 # -------------------- Flask Routes --------------------
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
@@ -121,36 +221,123 @@ def upload_file():
             return redirect(request.url)
 
         if file and allowed_file(file.filename):
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(filepath)
-
-            company_name, date_of_incorp, llpin, pan, ds_name = extract_details_from_image(filepath)
-
-            validation_status = "CIN not found in OCR"
-            gst_details = None
-
-            if llpin != "LLPIN / CIN not found":
-                gst_details = get_gst_details(llpin)
-                if gst_details:
-                    if company_name == gst_details["Company Name"] and date_of_incorp == gst_details["Date of Incorporation"]:
-                        validation_status = "Valid"
-                    else:
-                        validation_status = "Not Valid"
-                else:
-                    validation_status = "Failed to fetch GST details."
-
-            return render_template("result2.html",
-                                   company_name=company_name,
-                                   date_of_incorporation=date_of_incorp,
-                                   llpin=llpin,
-                                   pan=pan,
-                                   digital_signature_name=ds_name,
-                                   validation_status=validation_status,
-                                   gst_details=gst_details)
+            with tracing.trace():
+                # Decoded straight from memory; nothing is written to disk unless auditing is on.
+                try:
+                    with tracing.span("upload.read"):
+                        data = upload_store.read_upload(file.stream)
+                        digest = result_cache.content_hash(data)
+                except upload_store.UploadTooLarge as e:
+                    abort(413, str(e))
+                with tracing.span("upload.save"):
+                    upload_store.audit_copy(data, digest, file.filename)
+
+                refresh = request.values.get('refresh') == '1'
+                job = jobs.jobs.submit(verify_document, data, file.filename, digest, refresh)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify(job_id=job.id, status_url=url_for('job_status', job_id=job.id)), 202
+            return redirect(url_for('show_job', job_id=job.id))
     return render_template("upload2.html")
 
 
+@app.route('/jobs/<job_id>')
+def show_job(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    if job.status == jobs.DONE:
+        return render_template("result2.html", **job.result)
+    if job.status == jobs.FAILED:
+        return render_template("result2.html", validation_status=f"Error processing file: {job.error}")
+    return render_template("job_status.html", job=job)
+
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    return jsonify(job.to_dict(timings=request.args.get('timings') == '1'))
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    return Response(jobs.jobs.events(job), mimetype='text/event-stream')
+
+
+@app.route('/batch', methods=['POST'])
+def batch_upload():
+    # Archives may be bigger than single uploads; set before the body is parsed.
+    request.max_content_length = upload_store.BATCH_MAX_BYTES + upload_store.FORM_OVERHEAD_BYTES
+    archive = request.files.get('file')
+    if archive is None or not zipfile.is_zipfile(archive.stream):
+        abort(400, "Upload a .zip of certificate images")
+    try:
+        batch.check_archive(archive.stream)
+    except upload_store.UploadTooLarge as e:
+        abort(413, str(e))
+    output_format = request.values.get('format', 'jsonl')
+    if output_format not in batch.MEDIA_TYPES:
+        abort(400, "format must be jsonl or csv")
+    concurrency = request.values.get('lookup_concurrency', batch.BATCH_LOOKUP_CONCURRENCY, type=int)
+    refresh = request.values.get('refresh') == '1'
+    # The upload is closed once this view returns, before the response has finished streaming.
+    copy = tempfile.TemporaryFile()
+    archive.stream.seek(0)
+    try:
+        upload_store.copy_upload(archive.stream, copy, upload_store.BATCH_MAX_BYTES)
+    except upload_store.UploadTooLarge as e:
+        copy.close()
+        abort(413, str(e))
+    copy.seek(0)
+
+    def generate():
+        try:
+            with batch.open_documents(copy) as documents:
+                rows = batch.run_batch(documents, sys.modules[__name__], concurrency, refresh)
+                yield from batch.format_rows(rows, "incorporation", output_format)
+        finally:
+            copy.close()
+
+    return Response(stream_with_context(generate()), mimetype=batch.MEDIA_TYPES[output_format])
+
+
+@app.route('/verifications')
+def verification_history():
+    # Every verification of a CIN/LLPIN, GSTIN, PAN or document hash, newest first.
+    return jsonify(verifications=verification_store.store.history(
+        cin=request.args.get('cin'), gstin=request.args.get('gstin'), pan=request.args.get('pan'),
+        digest=request.args.get('digest'),
+        limit=request.args.get('limit', verification_store.HISTORY_LIMIT, type=int)))
+
+
+@app.route('/verifications/<int:verification_id>')
+def verification(verification_id):
+    return jsonify(verification_store.store.get(verification_id) or abort(404))
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(registry=result_cache.registry_cache.snapshot(), ocr=result_cache.ocr_cache.snapshot(),
+                   lookups=lookup_scheduler.snapshot())
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(tracing.metrics(), mimetype=tracing.CONTENT_TYPE)
+
+
+@app.route('/healthz')
+def healthz():
+    return jsonify(warmup.liveness())
+
+
+@app.route('/readyz')
+def readyz():
+    status = warmup.readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
 if __name__ == '__main__':
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Warm the OCR models and browsers in the serving process, not in the reloader's watcher process.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup.start()
     app.run(port=5001, debug=True)
 
@@ -1,122 +1,180 @@
-import re
 import os
-import time
-from flask import Flask, render_template, request, redirect
-from paddleocr import PaddleOCR
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import re
+import sys
+from flask import Flask, Response, abort, jsonify, render_template, request, redirect, url_for
+
+import field_match
+import incorporation_fields
+import jobs
+import layout_fields
+import lookup_scheduler
+import ocr_engine
+import pdf_pages
+import preprocess
+import registry_http
+import result_cache
+import scraper_pool
+import speculative
+import tracing
+import upload_store
+import verification_store
+import warmup
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png'}
+app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png', 'pdf'}
+upload_store.configure_flask(app)
 
 # ---------- Utility Functions ----------
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def extract_details_from_image(img_path):
-    ocr = PaddleOCR(use_angle_cls=True, lang='en')
-    result = ocr.ocr(img_path)
-    extracted_text = " ".join([line[1][0] for line in result[0]])
-
-    company_name_match = re.search(r"hereby certify that (.+?) is incorporated on", extracted_text, re.IGNORECASE)
-    company_name = company_name_match.group(1).upper() if company_name_match else "COMPANY NAME NOT FOUND"
-
-    date_in_words_match = re.search(r"incorporated on (.+?) under the Companies Act", extracted_text, re.IGNORECASE)
-    if date_in_words_match:
-        date_in_words = date_in_words_match.group(1)
-        month_mapping = {
-            "January": "January", "February": "February", "March": "March", "April": "April", "May": "May", "June": "June",
-            "July": "July", "August": "August", "September": "September", "October": "October", "November": "November", "December": "December"
-        }
-        day_mapping = {
-            "First": "01", "Second": "02", "Third": "03", "Fourth": "04", "Fifth": "05", "Sixth": "06",
-            "Seventh": "07", "Eighth": "08", "Ninth": "09", "Tenth": "10", "Eleventh": "11", "Twelfth": "12",
-            "Thirteenth": "13", "Fourteenth": "14", "Fifteenth": "15", "Sixteenth": "16", "Seventeenth": "17",
-            "Eighteenth": "18", "Nineteenth": "19", "Twentieth": "20", "Twenty-first": "21", "Twenty-second": "22",
-            "Twenty-third": "23", "Twenty-fourth": "24", "Twenty-fifth": "25", "Twenty-sixth": "26",
-            "Twenty-seventh": "27", "Twenty-eighth": "28", "Twenty-ninth": "29", "Thirtieth": "30", "Thirty-first": "31"
-        }
-        day_match = re.search(r"(First|Second|Third|Fourth|Fifth|Sixth|Seventh|Eighth|Ninth|Tenth|Eleventh|Twelfth|Thirteenth|Fourteenth|Fifteenth|Sixteenth|Seventeenth|Eighteenth|Nineteenth|Twentieth|Twenty-first|Twenty-second|Twenty-third|Twenty-fourth|Twenty-fifth|Twenty-sixth|Twenty-seventh|Twenty-eighth|Twenty-ninth|Thirtieth|Thirty-first)", date_in_words)
-        month_match = re.search(r"(January|February|March|April|May|June|July|August|September|October|November|December)", date_in_words)
-        year_match = re.search(r"(Two thousand (\w+))", date_in_words)
-        if day_match and month_match and year_match:
-            day = day_mapping.get(day_match.group(1), "01")
-            month = month_mapping.get(month_match.group(1), "January")
-            year_text = year_match.group(2).strip().lower()
-            if year_text == "nineteen":
-                year = "2019"
-            elif year_text == "eighteen":
-                year = "2018"
-            elif year_text == "twenty":
-                year = "2020"
-            else:
-                year = "20" + year_text
-            date_of_incorporation = f"{day} {month} {year}"
-        else:
-            date_of_incorporation = "Date not found"
-    else:
-        date_of_incorporation = "Date not found"
-
-    llpin_match = re.search(r"Identity Number of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    llpin = llpin_match.group(1).strip() if llpin_match else "LLPIN / CIN not found"
-
-    pan_match = re.search(r"Permanent Account Number\(PAN\) of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    pan_match_2 = re.search(r"\(PAN\) of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    pan_match_3 = re.search(r"Permanent Account Number\(PAN\)of the company is\s*([^\s]+)", extracted_text, re.IGNORECASE)
-    if pan_match:
-        pan = pan_match.group(1).strip()
-    elif pan_match_2:
-        pan = pan_match_2.group(1).strip()
-    elif pan_match_3:
-        pan = pan_match_3.group(1).strip()
-    else:
-        pan = "PAN not found"
+# Lines re-read at high resolution when OCR is unsure of them; the CIN is what the registry is searched by.
+LAYOUT_FIELDS = [
+    layout_fields.LabelSpec("llpin", ["Identity Number of the company is"], re.compile(r"\S+")),
+    layout_fields.LabelSpec("pan", ["(PAN) of the company is"], re.compile(r"\S+")),
+]
 
-    digital_signature_match = re.search(r"Digital Signature Certificate\s*(.+?)\s*For and on behalf of", extracted_text, re.IGNORECASE)
-    digital_signature_name = digital_signature_match.group(1).strip() if digital_signature_match else "Digital Signature Name not found"
+def ocr_text(img, timings=None, on_line=None, load_full=None):
+    """OCR an image's text; ``load_full`` returns it before downscaling, for re-reading uncertain fields."""
+    lines = ocr_engine.read_lines(img, timings, on_line)
+    lines = layout_fields.reocr_low_confidence(lines, LAYOUT_FIELDS, img, load_full, timings)
+    return " ".join(line.text for line in lines)
 
-    return company_name, date_of_incorporation, llpin, pan, digital_signature_name
+def parse_text(extracted_text):
+    with tracing.span("parse.incorporation_fields"):
+        return incorporation_fields.parse_certificate_text(extracted_text)
 
-def get_gst_details(CIN):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
+def extract_details_from_image(source, timings=None, on_line=None):
+    image = preprocess.load_image(source, timings=timings)
+    return parse_text(ocr_text(image, timings, on_line, lambda: preprocess.load_image(source, max_side=0)))
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-    url = "https://www.zaubacorp.com/company/ALEP-MANAGEMENT-LLP/AAS-9086"
-    driver.get(url)
+def extract_details_from_pdf(source, timings=None, on_line=None):
+    # Render and OCR one page at a time, stopping once every field has been found.
+    extracted_text = ""
+    details = incorporation_fields.parse_certificate_text(extracted_text)
+    for page in pdf_pages.iter_pages(source):
+        page_text = ocr_text(preprocess.prepare(page, timings=timings), timings, on_line, lambda: page)
+        extracted_text = f"{extracted_text} {page_text}".strip()
+        details = parse_text(extracted_text)
+        if not any(value in incorporation_fields.NOT_FOUND for value in details):
+            break
+    return details
 
-    input_field = driver.find_element(By.ID, 'searchid')
-    input_field.send_keys(CIN)
-    input_field.send_keys(Keys.RETURN)
+def extract_details(source, timings=None, on_line=None):
+    """OCR an upload given as a file path or as its bytes."""
+    if pdf_pages.is_pdf(source):
+        return extract_details_from_pdf(source, timings, on_line)
+    return extract_details_from_image(source, timings, on_line)
 
-    time.sleep(5)
+def get_gst_details(CIN):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
+    url = "https://www.zaubacorp.com/company/ALEP-MANAGEMENT-LLP/AAS-9086"
     try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p"))
-        )
-        company_name_2 = driver.find_element(By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p").text
-        date_of_incorporation_2 = driver.find_element(By.XPATH, "//td[p[text()='Date of Incorporation']]/following-sibling::td/p").text
+        with scraper_pool.pool.session() as driver:
+            with tracing.span("browser.page_load.zaubacorp"):
+                driver.get(url)
+
+            input_field = driver.find_element(By.ID, 'searchid')
+            input_field.send_keys(CIN)
+            input_field.send_keys(Keys.RETURN)
+
+            with tracing.span("browser.wait.company_details"):
+                try:
+                    WebDriverWait(driver, scraper_pool.BROWSER_WAIT_TIMEOUT).until(
+                        EC.presence_of_element_located((By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p"))
+                    )
+                except TimeoutException:
+                    # No such LLPIN on zaubacorp; not a failure.
+                    print(f"No company found for {CIN}")
+                    return None
+            company_name_2 = driver.find_element(By.XPATH, "//td[p[text()='Company Name']]/following-sibling::td/p").text
+            date_of_incorporation_2 = driver.find_element(By.XPATH, "//td[p[text()='Date of Incorporation']]/following-sibling::td/p").text
     except Exception as e:
         print(f"Error extracting details: {e}")
-        driver.quit()
-        return None
+        raise
 
-    driver.quit()
     return {
         'Company Name': company_name_2,
         'Date of Incorporation': date_of_incorporation_2
     }
 
+def lookup_registry(CIN):
+    return registry_http.lookup("zaubacorp", CIN, fallback=get_gst_details)
+
+def cached_registry_lookup(CIN, refresh=False):
+    return result_cache.cached_lookup("zaubacorp", CIN, lookup_registry, refresh=refresh)
+
+# ---------- Verification ----------
+def extract_document(source, original_filename, digest, on_line=None):
+    ocr_timings = {}
+    details = result_cache.cached_parse(
+        "main2.extract_details_from_image", incorporation_fields.PARSER_VERSION, digest,
+        lambda: extract_details(source, ocr_timings, on_line))
+    tracing.record_timings("ocr", ocr_timings)
+    app.logger.info("OCR timings for %s: %s", original_filename, ocr_engine.format_timings(ocr_timings))
+    return details
+
+def validate_document(details, refresh=False, prefetch=None):
+    company_name, date_of_incorporation, llpin, pan, digital_signature_name = details
+    gst_details = None
+    field_matches = None
+    if llpin != "LLPIN / CIN not found":
+        try:
+            gst_details = prefetch.resolve(llpin) if prefetch is not None else cached_registry_lookup(llpin, refresh)
+        except lookup_scheduler.RegistryUnavailable as e:
+            app.logger.warning("Registry lookup for %s unavailable: %s", llpin, e)
+            validation_status = "Registry unavailable, please try again later."
+        else:
+            if gst_details:
+                matches = field_match.compare([
+                    ('company_name', field_match.NAME, company_name, gst_details['Company Name']),
+                    ('date_of_incorporation', field_match.DATE, date_of_incorporation, gst_details['Date of Incorporation']),
+                ])
+                validation_status = "Valid" if field_match.all_matched(matches) else "Not Valid"
+                field_matches = field_match.explain(matches)
+            else:
+                validation_status = "Failed to fetch GST details."
+    else:
+        validation_status = "CIN not found in the OCR process."
+
+    return dict(
+        company_name=company_name,
+        date_of_incorporation=date_of_incorporation,
+        llpin=llpin,
+        pan=pan,
+        digital_signature_name=digital_signature_name,
+        validation_status=validation_status,
+        field_matches=field_matches,
+        gst_details=gst_details if gst_details else None
+    )
+
+def verify_document(progress, source, original_filename, digest, refresh=False):
+    prefetch = speculative.LookupPrefetch(speculative.CIN_RE, lambda CIN: cached_registry_lookup(CIN, refresh))
+    progress("ocr")
+    with tracing.span("verify.ocr"):
+        details = extract_document(source, original_filename, digest, prefetch.feed)
+    progress("registry_lookup")
+    with tracing.span("verify.registry_lookup"):
+        result = validate_document(details, refresh, prefetch)
+    verification_store.save(sys.modules[__name__], digest, original_filename, details, result)
+    return result
+
+def verification_summary(result):
+    return dict(
+        doc_type="incorporation",
+        cin=None if result['llpin'] in incorporation_fields.NOT_FOUND else result['llpin'],
+        pan=None if result['pan'] in incorporation_fields.NOT_FOUND else result['pan'],
+        status=result['validation_status'],
+        valid=result['validation_status'] == "Valid",
+        registry=result['gst_details'],
+        field_matches=result['field_matches']
+    )
+
 # ---------- Routes ----------
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
@@ -127,38 +185,77 @@ def upload_file():
         if file.filename == '':
             return redirect(request.url)
         if file and allowed_file(file.filename):
-            filename = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(filename)
-            company_name, date_of_incorporation, llpin, pan, digital_signature_name = extract_details_from_image(filename)
-            gst_details = None
-            if llpin != "LLPIN / CIN not found":
-                gst_details = get_gst_details(llpin)
-                if gst_details:
-                    scraped_company_name = gst_details['Company Name']
-                    scraped_date_of_incorporation = gst_details['Date of Incorporation']
-                    validation_status = "Valid" if company_name == scraped_company_name and date_of_incorporation == scraped_date_of_incorporation else "Not Valid"
-                else:
-                    validation_status = "Failed to fetch GST details."
-            else:
-                validation_status = "CIN not found in the OCR process."
-
-            return render_template(
-                'result2.html', 
-                company_name=company_name,
-                date_of_incorporation=date_of_incorporation,
-                llpin=llpin,
-                pan=pan,
-                digital_signature_name=digital_signature_name,
-                validation_status=validation_status,
-                gst_details=gst_details if gst_details else None
-            )
+            with tracing.trace():
+                try:
+                    with tracing.span("upload.read"):
+                        data = upload_store.read_upload(file.stream)
+                        digest = result_cache.content_hash(data)
+                except upload_store.UploadTooLarge as e:
+                    abort(413, str(e))
+                with tracing.span("upload.save"):
+                    upload_store.audit_copy(data, digest, file.filename)
+                refresh = request.values.get('refresh') == '1'
+                job = jobs.jobs.submit(verify_document, data, file.filename, digest, refresh)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify(job_id=job.id, status_url=url_for('job_status', job_id=job.id)), 202
+            return redirect(url_for('show_job', job_id=job.id))
     return render_template('upload2.html')
 
+@app.route('/jobs/<job_id>')
+def show_job(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    if job.status == jobs.DONE:
+        return render_template('result2.html', **job.result)
+    if job.status == jobs.FAILED:
+        return render_template('result2.html', validation_status=f"Error processing file: {job.error}")
+    return render_template('job_status.html', job=job)
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    return jsonify(job.to_dict(timings=request.args.get('timings') == '1'))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = jobs.jobs.get(job_id) or abort(404)
+    return Response(jobs.jobs.events(job), mimetype='text/event-stream')
+
 @app.route('/next_step')
 def next_step():
     return "Next step functionality not implemented yet."
 
+@app.route('/verifications')
+def verification_history():
+    # Every verification of a CIN/LLPIN, GSTIN, PAN or document hash, newest first.
+    return jsonify(verifications=verification_store.store.history(
+        cin=request.args.get('cin'), gstin=request.args.get('gstin'), pan=request.args.get('pan'),
+        digest=request.args.get('digest'),
+        limit=request.args.get('limit', verification_store.HISTORY_LIMIT, type=int)))
+
+@app.route('/verifications/<int:verification_id>')
+def verification(verification_id):
+    return jsonify(verification_store.store.get(verification_id) or abort(404))
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(registry=result_cache.registry_cache.snapshot(), ocr=result_cache.ocr_cache.snapshot(),
+                   lookups=lookup_scheduler.snapshot())
+
+@app.route('/metrics')
+def metrics():
+    return Response(tracing.metrics(), mimetype=tracing.CONTENT_TYPE)
+
+@app.route('/healthz')
+def healthz():
+    return jsonify(warmup.liveness())
+
+@app.route('/readyz')
+def readyz():
+    status = warmup.readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
 if __name__ == '__main__':
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
+    # Warm the OCR models and browsers in the serving process, not in the reloader's watcher process.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup.start()
     app.run(port=5001, debug=True)
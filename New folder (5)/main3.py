@@ -1,97 +1,51 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from paddleocr import PaddleOCR
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import os
 import re
+import sys
+import tempfile
+import zipfile
+
+import batch
+import field_match
+import jobs
+import layout_fields
+import lookup_scheduler
+import ocr_engine
+import pdf_pages
+import preprocess
+import registry_http
+import result_cache
+import scraper_pool
+import speculative
+import tracing
+import upload_store
+import verification_store
+import warmup
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
-UPLOAD_FOLDER = "uploads"
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
-
-# Ensure UPLOAD_FOLDER exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf"}
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Initialize OCR
-ocr = PaddleOCR(use_angle_cls=True, lang="en")
-
-def extract_with_first_method(img_path):
-    result = ocr.ocr(img_path)
-    if not result or not result[0]:
-        return None
-
-    registration_number = ""
-    legal_name = ""
-    constitution_of_business = ""
-    type_of_registration = ""
-    period_of_validity_from = ""
+# Load the OCR engines and start the browsers once per process, in the background so
+# the app answers /healthz (and the upload page) while they load
+@app.on_event("startup")
+def start_pools():
+    warmup.start()
 
-    found_legal_name = False
-    found_constitution = False
-    found_type_registration = False
-    found_period_validity = False
-    found_from = False
+@app.on_event("shutdown")
+def stop_pools():
+    scraper_pool.pool.close()
 
-    for line in result[0]:
-        text = line[1][0]
-
-        if "Registration Number" in text.replace(" ", ""):
-            registration_number = text.split(":")[-1].strip()
-        elif "Legal Name" in text:
-            found_legal_name = True
-            legal_name = text.split(":")[-1].strip() if ":" in text else ""
-        elif found_legal_name:
-            legal_name = text.strip()
-            found_legal_name = False
-        elif "Constitution of Business" in text:
-            found_constitution = True
-            constitution_of_business = text.split(":")[-1].strip() if ":" in text else ""
-        elif found_constitution:
-            constitution_of_business = text.strip()
-            found_constitution = False
-        elif "Type of Registration" in text:
-            found_type_registration = True
-            type_of_registration = text.split(":")[-1].strip() if ":" in text else ""
-        elif found_type_registration:
-            type_of_registration = text.strip()
-            found_type_registration = False
-        elif "Period of Validity" in text:
-            found_period_validity = True
-        elif found_period_validity and "From" in text:
-            found_from = True
-        elif found_from:
-            date_match = re.search(r"\d{2}/\d{2}/\d{4}", text)
-            if date_match:
-                period_of_validity_from = date_match.group(0)
-            found_from = False
-            found_period_validity = False
-
-    return {
-        "Registration Number": registration_number,
-        "Legal Name": legal_name,
-        "Constitution of Business": constitution_of_business,
-        "Type of Registration": type_of_registration,
-        "Registration Date": period_of_validity_from
-    } if period_of_validity_from else None
-
-def extract_with_second_method(img_path):
-    result = ocr.ocr(img_path)
-    if not result or not result[0]:
-        return None
+def read_ocr_lines(img, timings=None, on_line=None):
+    return ocr_engine.read_lines(img, timings=timings, on_line=on_line)
 
+def parse_gst_lines(lines, validity_label):
     registration_number = ""
     legal_name = ""
     constitution_of_business = ""
@@ -101,13 +55,13 @@ def extract_with_second_method(img_path):
     found_legal_name = False
     found_constitution = False
     found_type_registration = False
-    found_date_of_validity = False
+    found_validity = False
     found_from = False
 
-    for line in result[0]:
-        text = line[1][0]
+    for line in lines:
+        text = line.text
 
-        if "Registration Number" in text.replace(" ", ""):
+        if "RegistrationNumber" in text.replace(" ", ""):
             registration_number = text.split(":")[-1].strip()
         elif "Legal Name" in text:
             found_legal_name = True
@@ -127,16 +81,16 @@ def extract_with_second_method(img_path):
         elif found_type_registration:
             type_of_registration = text.strip()
             found_type_registration = False
-        elif "Date of Validity" in text:
-            found_date_of_validity = True
-        elif found_date_of_validity and "From" in text:
+        elif validity_label in text:
+            found_validity = True
+        elif found_validity and "From" in text:
             found_from = True
         elif found_from:
             date_match = re.search(r"\d{2}/\d{2}/\d{4}", text)
             if date_match:
                 registration_date = date_match.group(0)
             found_from = False
-            found_date_of_validity = False
+            found_validity = False
 
     return {
         "Registration Number": registration_number,
@@ -146,91 +100,347 @@ def extract_with_second_method(img_path):
         "Registration Date": registration_date
     }
 
+# The certificate's field table, read by pairing each label with the value beside or under it.
+GST_LAYOUT = [
+    layout_fields.LabelSpec("Registration Number", ["Registration Number"], speculative.GSTIN_RE),
+    layout_fields.LabelSpec("Legal Name", ["Legal Name"], None),
+    layout_fields.LabelSpec("Constitution of Business", ["Constitution of Business"], None),
+    layout_fields.LabelSpec("Type of Registration", ["Type of Registration"], None),
+    layout_fields.LabelSpec("Registration Date", ["Period of Validity", "Date of Validity", "From"],
+                            re.compile(r"\d{2}/\d{2}/\d{4}")),
+]
+LAYOUT_FIELDS = GST_LAYOUT
+
+def extract_with_layout(lines):
+    if not lines:
+        return None
+    details = layout_fields.values(layout_fields.extract(lines, GST_LAYOUT))
+    return details if all(details.values()) else None
+
+def extract_with_first_method(lines):
+    if not lines:
+        return None
+    details = parse_gst_lines(lines, "Period of Validity")
+    return details if details["Registration Date"] else None
+
+def extract_with_second_method(lines):
+    if not lines:
+        return None
+    return parse_gst_lines(lines, "Date of Validity")
+
+# Bump whenever a parser below or the OCR preprocessing changes so cached OCR results are re-parsed.
+PARSER_VERSION = "4"
+
+# Parser strategies, tried in order over the lines of a single OCR pass.
+# Add new certificate layouts here rather than re-running OCR per layout.
+GST_PARSERS = [extract_with_layout, extract_with_first_method, extract_with_second_method]
+
+def extract_gst_details(lines):
+    for parser in GST_PARSERS:
+        with tracing.span(f"parse.{parser.__name__}"):
+            details = parser(lines)
+        if details:
+            return details
+    return None
+
+parse_lines = extract_gst_details
+
+# Labels of the certificate's field table, used to learn where that table sits on the page.
+GST_FIELD_LABELS = ["Registration Number", "Legal Name", "Constitution of Business", "Type of Registration", "Validity"]
+
+def is_complete(details):
+    return bool(details) and all(details.values())
+
+def extract_gst_details_from_pdf(source, timings=None, on_line=None):
+    # Render and OCR one page at a time, stopping once every field has been found.
+    lines = []
+    details = None
+    for page in pdf_pages.iter_pages(source):
+        image = preprocess.prepare(page, timings=timings)
+        page_lines = read_ocr_lines(image, timings, on_line)
+        lines.extend(layout_fields.reocr_low_confidence(page_lines, GST_LAYOUT, image, lambda: page, timings))
+        details = extract_gst_details(lines)
+        if is_complete(details):
+            break
+    return details
+
+def extract_gst_details_from_image(source, timings=None, on_line=None):
+    image = preprocess.load_image(source, timings=timings)
+    if preprocess.OCR_ROI_CROP:
+        # OCR just the learned field table first; fall back to the whole page if anything is missing.
+        region = preprocess.crop_roi(image, "gst")
+        if region is not None:
+            details = extract_gst_details(read_ocr_lines(region, timings, on_line))
+            if is_complete(details):
+                return details
+
+    lines = read_ocr_lines(image, timings, on_line)
+    # Fields OCR was unsure of are re-read from the full-resolution upload before parsing.
+    lines = layout_fields.reocr_low_confidence(
+        lines, GST_LAYOUT, image, lambda: preprocess.load_image(source, max_side=0), timings)
+    details = extract_gst_details(lines)
+    if preprocess.OCR_ROI_CROP and is_complete(details):
+        values = list(details.values())
+        boxes = [line.box for line in lines
+                 if any(label in line.text for label in GST_FIELD_LABELS) or any(value in line.text for value in values)]
+        preprocess.roi_profiles.learn("gst", boxes, image.shape)
+    return details
+
+def extract_gst_details_from_file(source, timings=None, on_line=None):
+    """OCR an upload given as a file path or as its bytes."""
+    if pdf_pages.is_pdf(source):
+        return extract_gst_details_from_pdf(source, timings, on_line)
+    return extract_gst_details_from_image(source, timings, on_line)
+
 def get_gst_details(gstin):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--window-size=1920x1080")
-
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-    url = "https://cleartax.in/gst-number-search/"
-    driver.get(url)
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
+    url = "https://cleartax.in/gst-number-search/"
     try:
-        input_field = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "input"))
-        )
-        input_field.send_keys(gstin)
-        input_field.send_keys(Keys.RETURN)
-
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//span[@id='Business Name']"))
-        )
-
-        details = {
-            "Legal Name": driver.find_element(By.XPATH, "//span[@id='Business Name']/following-sibling::h4/following-sibling::small").text,
-            "Constitution of the Business": driver.find_element(By.XPATH, "//span[@id='Entity Type']/following-sibling::h4/following-sibling::small").text,
-            "Registration Date": driver.find_element(By.XPATH, "//span[@id='Registration Date']/following-sibling::h4/following-sibling::small").text,
-            "PAN": driver.find_element(By.XPATH, "//span[@id='PAN']/following-sibling::h4/following-sibling::small").text,
-            "Type of Registration": driver.find_element(By.XPATH, "//span[@id='Registration Type']/following-sibling::h4/following-sibling::small").text
-        }
-        return details
+        with scraper_pool.pool.session() as driver:
+            with tracing.span("browser.page_load.cleartax"):
+                driver.get(url)
+
+            with tracing.span("browser.wait.search_input"):
+                input_field = WebDriverWait(driver, scraper_pool.BROWSER_WAIT_TIMEOUT).until(
+                    EC.presence_of_element_located((By.ID, "input"))
+                )
+            input_field.send_keys(gstin)
+            input_field.send_keys(Keys.RETURN)
+
+            with tracing.span("browser.wait.business_details"):
+                try:
+                    WebDriverWait(driver, scraper_pool.BROWSER_WAIT_TIMEOUT).until(
+                        EC.presence_of_element_located((By.XPATH, "//span[@id='Business Name']"))
+                    )
+                except TimeoutException:
+                    # The search ran but found no business: cleartax has no such GSTIN.
+                    print(f"No business found for {gstin}")
+                    return None
+
+            details = {
+                "Legal Name": driver.find_element(By.XPATH, "//span[@id='Business Name']/following-sibling::h4/following-sibling::small").text,
+                "Constitution of the Business": driver.find_element(By.XPATH, "//span[@id='Entity Type']/following-sibling::h4/following-sibling::small").text,
+                "Registration Date": driver.find_element(By.XPATH, "//span[@id='Registration Date']/following-sibling::h4/following-sibling::small").text,
+                "PAN": driver.find_element(By.XPATH, "//span[@id='PAN']/following-sibling::h4/following-sibling::small").text,
+                "Type of Registration": driver.find_element(By.XPATH, "//span[@id='Registration Type']/following-sibling::h4/following-sibling::small").text
+            }
+            return details
     except Exception as e:
         print(f"Error extracting details: {e}")
-        return None
-    finally:
-        driver.quit()
+        raise
+
+def lookup_registry(gstin):
+    return registry_http.lookup("cleartax", gstin, fallback=get_gst_details)
+
+def cached_registry_lookup(gstin, refresh=False):
+    return result_cache.cached_lookup("cleartax", gstin, lookup_registry, refresh=refresh)
 
 @app.get("/next_step", response_class=HTMLResponse)
 async def next_step(request: Request):
     return templates.TemplateResponse("upload2.html", {"request": request})
 
+def extract_document(source, filename, digest, on_line=None):
+    ocr_timings = {}
+    # Wrapped so that "nothing extracted" is cached as well.
+    cached = result_cache.cached_parse(
+        "main3.extract_gst_details", PARSER_VERSION, digest,
+        lambda: {"ocr_results": extract_gst_details_from_file(source, ocr_timings, on_line)})
+    tracing.record_timings("ocr", ocr_timings)
+    print(f"OCR timings for {filename}: {ocr_engine.format_timings(ocr_timings)}")
+    return cached["ocr_results"]
+
+def validate_document(ocr_results, refresh=False, prefetch=None):
+    if not ocr_results:
+        return {"validation_message": "No information extracted from image."}
+
+    gstin = ocr_results.get("Registration Number")
+    try:
+        web_results = prefetch.resolve(gstin) if prefetch is not None else cached_registry_lookup(gstin, refresh)
+    except lookup_scheduler.RegistryUnavailable as e:
+        print(f"Registry lookup for {gstin} unavailable: {e}")
+        return {
+            "ocr_results": ocr_results,
+            "web_results": None,
+            "validation_message": "Registry unavailable, please try again later."
+        }
+
+    field_matches = None
+    if web_results:
+        matches = field_match.compare([
+            ("Legal Name", field_match.NAME, ocr_results.get("Legal Name"), web_results.get("Legal Name")),
+            ("Registration Date", field_match.DATE, ocr_results.get("Registration Date"), web_results.get("Registration Date")),
+            ("Constitution of Business", field_match.TEXT, ocr_results.get("Constitution of Business"),
+             web_results.get("Constitution of the Business")),
+        ])
+        if field_match.all_matched(matches):
+            validation_message = "The details are valid."
+        else:
+            validation_message = "The details are not valid."
+        field_matches = field_match.explain(matches)
+    else:
+        validation_message = "No details found from web scraping."
+
+    return {
+        "ocr_results": ocr_results,
+        "web_results": web_results,
+        "field_matches": field_matches,
+        "validation_message": validation_message
+    }
+
+def verify_document(progress, source, filename, digest, refresh=False):
+    # The cleartax lookup starts as soon as a GSTIN is recognized, while OCR carries on with the rest of the page.
+    prefetch = speculative.LookupPrefetch(speculative.GSTIN_RE, lambda gstin: cached_registry_lookup(gstin, refresh))
+    progress("ocr")
+    with tracing.span("verify.ocr"):
+        ocr_results = extract_document(source, filename, digest, prefetch.feed)
+    progress("registry_lookup")
+    with tracing.span("verify.registry_lookup"):
+        result = validate_document(ocr_results, refresh, prefetch)
+    verification_store.save(sys.modules[__name__], digest, filename, ocr_results, result)
+    return result
+
+def verification_summary(result):
+    """The identifiers, status and registry snapshot of a ``validate_document`` result, for ``verification_store``."""
+    ocr_results = result.get("ocr_results") or {}
+    gstin = ocr_results.get("Registration Number")
+    web_results = result.get("web_results")
+    return {
+        "doc_type": "gst",
+        "gstin": gstin or None,
+        # Characters 3-12 of a GSTIN are the holder's PAN.
+        "pan": (web_results or {}).get("PAN") or (gstin[2:12] if gstin and len(gstin) == 15 else None),
+        "status": result["validation_message"],
+        "valid": result["validation_message"] == "The details are valid.",
+        "registry": web_results,
+        "field_matches": result.get("field_matches"),
+    }
+
 @app.post("/upload/")
-async def upload_file(request: Request, file: UploadFile = File(...)):
+async def upload_file(request: Request, file: UploadFile = File(...), refresh: bool = False):
     if not allowed_file(file.filename):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(await file.read())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving file: {e}")
-
-    try:
-        ocr_results = extract_with_first_method(file_path) or extract_with_second_method(file_path)
-
-        if ocr_results:
-            gstin = ocr_results.get("Registration Number")
-            web_results = get_gst_details(gstin)
-
-            if web_results:
-                if (ocr_results.get("Legal Name") == web_results.get("Legal Name") and
-                    ocr_results.get("Registration Date") == web_results.get("Registration Date") and
-                    ocr_results.get("Constitution of Business") == web_results.get("Constitution of the Business")):
-                    validation_message = "The details are valid."
-                else:
-                    validation_message = "The details are not valid."
-            else:
-                validation_message = "No details found from web scraping."
-
-            return templates.TemplateResponse("result.html", {
-                "request": request,
-                "ocr_results": ocr_results,
-                "web_results": web_results,
-                "validation_message": validation_message
-            })
-
+    with tracing.trace():
+        # Starlette spools the upload; it is decoded from memory and only written to disk when auditing is on.
+        # Reading, hashing and the audit copy block, so they run in the thread pool rather than on the event loop.
+        try:
+            with tracing.span("upload.read"):
+                content = await run_in_threadpool(upload_store.read_upload, file.file)
+                digest = await run_in_threadpool(result_cache.content_hash, content)
+        except upload_store.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        try:
+            with tracing.span("upload.save"):
+                await run_in_threadpool(upload_store.audit_copy, content, digest, file.filename)
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Error saving file: {e}")
+
+        # OCR and the registry scrape block for seconds, so they run on the job pool, not the event loop.
+        job = jobs.jobs.submit(verify_document, content, file.filename, digest, refresh)
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({"job_id": job.id, "status_url": f"/jobs/{job.id}/status"}, status_code=202)
+    return RedirectResponse(url=f"/jobs/{job.id}", status_code=303)
+
+def get_job(job_id):
+    job = jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_class=HTMLResponse)
+async def show_job(request: Request, job_id: str):
+    job = get_job(job_id)
+    if job.status == jobs.DONE:
+        return templates.TemplateResponse("result.html", {"request": request, **job.result})
+    if job.status == jobs.FAILED:
         return templates.TemplateResponse("result.html", {
             "request": request,
-            "validation_message": "No information extracted from image."
+            "validation_message": f"Error processing file: {job.error}"
         })
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
+    return templates.TemplateResponse("job_status.html", {"request": request, "job": job})
+
+@app.get("/jobs/{job_id}/status")
+async def job_status(job_id: str, timings: bool = False):
+    return get_job(job_id).to_dict(timings=timings)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Starlette iterates this blocking generator in its thread pool.
+    return StreamingResponse(jobs.jobs.events(get_job(job_id)), media_type="text/event-stream")
+
+def copy_archive(upload):
+    """Check a batch upload and copy it to a temporary file; it blocks on disk, so runs in the thread pool."""
+    if not zipfile.is_zipfile(upload):
+        raise zipfile.BadZipFile("not a zip file")
+    # The upload is closed once the handler returns, before the response has finished streaming.
+    archive = tempfile.TemporaryFile()
+    upload.seek(0)
+    try:
+        upload_store.copy_upload(upload, archive, upload_store.BATCH_MAX_BYTES)
+        archive.seek(0)
+        batch.check_archive(archive)
+    except BaseException:
+        archive.close()
+        raise
+    archive.seek(0)
+    return archive
+
+@app.post("/batch")
+async def batch_upload(file: UploadFile = File(...), format: str = "jsonl",
+                       lookup_concurrency: int = batch.BATCH_LOOKUP_CONCURRENCY, refresh: bool = False):
+    if format not in batch.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be jsonl or csv")
+    try:
+        archive = await run_in_threadpool(copy_archive, file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Upload a .zip of certificate images")
+    except upload_store.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    def generate():
+        with archive, batch.open_documents(archive) as documents:
+            rows = batch.run_batch(documents, sys.modules[__name__], lookup_concurrency, refresh)
+            yield from batch.format_rows(rows, "gst", format)
+
+    # Starlette iterates this blocking generator in its thread pool.
+    return StreamingResponse(generate(), media_type=batch.MEDIA_TYPES[format])
 
 @app.get("/result", response_class=HTMLResponse)
 async def show_results(request: Request):
     return templates.TemplateResponse("result.html", {"request": request})
 
+@app.get("/verifications")
+async def verification_history(cin: str = None, gstin: str = None, pan: str = None, digest: str = None,
+                               limit: int = verification_store.HISTORY_LIMIT):
+    # Every verification of a CIN/LLPIN, GSTIN, PAN or document hash, newest first.
+    return {"verifications": verification_store.store.history(cin, gstin, pan, digest, limit)}
+
+@app.get("/verifications/{verification_id}")
+async def verification(verification_id: int):
+    record = verification_store.store.get(verification_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Verification not found")
+    return record
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return {"registry": result_cache.registry_cache.snapshot(), "ocr": result_cache.ocr_cache.snapshot(),
+            "lookups": lookup_scheduler.snapshot()}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=tracing.metrics(), media_type=tracing.CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    return warmup.liveness()
+
+@app.get("/readyz")
+async def readyz():
+    status = warmup.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
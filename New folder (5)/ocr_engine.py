@@ -0,0 +1,222 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# One warm engine per core by default, capped so a big box doesn't load a dozen model copies.
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", min(4, os.cpu_count() or 1)))
+OCR_CHECKOUT_TIMEOUT = float(os.environ.get("OCR_CHECKOUT_TIMEOUT", 120))
+# Threads each engine's inference may use; 0 keeps PaddleOCR's default. serve.py splits the cores between workers.
+OCR_CPU_THREADS = int(os.environ.get("OCR_CPU_THREADS", 0))
+# Recognize detected lines a batch at a time, handing each batch to the caller before the next.
+OCR_STREAMING = os.environ.get("OCR_STREAMING", "1") == "1"
+# PaddleOCR's own recognition batch size; smaller batches surface the first lines sooner.
+OCR_STREAM_BATCH = int(os.environ.get("OCR_STREAM_BATCH", 6))
+
+
+# One recognized text line: the 4-point box, the text and its recognition score.
+OCRLine = namedtuple("OCRLine", ["text", "box", "score"])
+
+
+class OCRPoolTimeout(Exception):
+    pass
+
+
+def build_engine():
+    # Imported here so the apps can start serving before Paddle is loaded; see warmup.py.
+    from paddleocr import PaddleOCR
+
+    if OCR_CPU_THREADS:
+        return PaddleOCR(use_angle_cls=True, lang='en', cpu_threads=OCR_CPU_THREADS)
+    return PaddleOCR(use_angle_cls=True, lang='en')
+
+
+# -------------------- Engine Pool --------------------
+class OCREnginePool:
+    """Bounded pool of warm PaddleOCR engines.
+
+    Engines are created at most ``size`` times for the life of the process and
+    handed to one caller at a time, so a PaddleOCR instance is never shared
+    between threads.
+    """
+
+    def __init__(self, size=OCR_POOL_SIZE, factory=build_engine):
+        self.size = max(1, size)
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._created
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _load(self):
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm_up(self):
+        """Load every engine up front so no request pays the model-load cost."""
+        while self._reserve_slot():
+            self._idle.put(self._load())
+
+    @contextmanager
+    def checkout(self, timings=None, timeout=OCR_CHECKOUT_TIMEOUT):
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            engine = None
+
+        load_seconds = 0.0
+        if engine is None:
+            if self._reserve_slot():
+                load_start = time.perf_counter()
+                engine = self._load()
+                load_seconds = time.perf_counter() - load_start
+            else:
+                try:
+                    engine = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise OCRPoolTimeout(f"No OCR engine became free within {timeout} seconds")
+
+        timings["model_load"] = timings.get("model_load", 0.0) + load_seconds
+        timings["checkout_wait"] = timings.get("checkout_wait", 0.0) + (time.perf_counter() - start - load_seconds)
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+    def ocr(self, img, timings=None, **kwargs):
+        timings = timings if timings is not None else {}
+        with self.checkout(timings) as engine:
+            start = time.perf_counter()
+            result = engine.ocr(img, **kwargs)
+            timings["inference"] = timings.get("inference", 0.0) + (time.perf_counter() - start)
+        return result
+
+
+pool = OCREnginePool()
+
+
+def run_ocr(img, timings=None, **kwargs):
+    """Run OCR on a path or image array using a pooled engine.
+
+    When ``timings`` is given it is filled with ``model_load``,
+    ``checkout_wait`` and ``inference`` durations in seconds.
+    """
+    return pool.ocr(img, timings=timings, **kwargs)
+
+
+# -------------------- Streaming --------------------
+def reading_order(boxes):
+    """Sort detected boxes top to bottom, then left to right within a row, as PaddleOCR does."""
+    boxes = sorted(boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_line(img, box):
+    """Warp a detected (possibly skewed) line box to an upright crop for the recognizer."""
+    points = np.array(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    crop = cv2.warpPerspective(img, cv2.getPerspectiveTransform(points, target), (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height / max(width, 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def stream_lines(img, timings=None, batch_size=OCR_STREAM_BATCH):
+    """Yield an image array's ``OCRLine``s in reading order as each batch is recognized.
+
+    Runs the same detection, angle classification and recognition steps as
+    ``PaddleOCR.ocr``, but recognizes the top of the page first, so
+    identifiers printed near the top are seen well before the page is done.
+    One engine stays checked out until the generator finishes or is closed.
+    """
+    timings = timings if timings is not None else {}
+    with pool.checkout(timings) as engine:
+        original = img.copy()
+        start = time.perf_counter()
+        boxes, _ = engine.text_detector(img)
+        timings["inference"] = timings.get("inference", 0.0) + (time.perf_counter() - start)
+        if boxes is None:
+            return
+        boxes = reading_order(list(boxes))
+        for offset in range(0, len(boxes), batch_size):
+            batch = boxes[offset:offset + batch_size]
+            start = time.perf_counter()
+            crops = [crop_line(original, box) for box in batch]
+            if engine.use_angle_cls:
+                crops, _, _ = engine.text_classifier(crops)
+            recognized, _ = engine.text_recognizer(crops)
+            timings["inference"] = timings.get("inference", 0.0) + (time.perf_counter() - start)
+            for box, (text, score) in zip(batch, recognized):
+                if score >= engine.drop_score:
+                    yield OCRLine(text=text, box=box.tolist(), score=score)
+
+
+def recognize(crops, timings=None):
+    """Recognize single-line crops (see ``crop_line``) without detection; returns ``(text, score)`` per crop."""
+    timings = timings if timings is not None else {}
+    with pool.checkout(timings) as engine:
+        start = time.perf_counter()
+        if engine.use_angle_cls:
+            crops, _, _ = engine.text_classifier(crops)
+        recognized, _ = engine.text_recognizer(crops)
+        timings["inference"] = timings.get("inference", 0.0) + (time.perf_counter() - start)
+    return recognized
+
+
+def read_lines(img, timings=None, on_line=None):
+    """OCR an image once and return its lines as a list of ``OCRLine``.
+
+    ``on_line`` is called with each line as soon as it is available: while
+    the page is still being recognized when streaming, otherwise after the
+    full pass. Paths are always read in a single pass.
+    """
+    if OCR_STREAMING and isinstance(img, np.ndarray):
+        lines = []
+        for line in stream_lines(img, timings):
+            if on_line is not None:
+                on_line(line)
+            lines.append(line)
+        return lines
+
+    result = run_ocr(img, timings=timings)
+    if not result or not result[0]:
+        return []
+    lines = [OCRLine(text=line[1][0], box=line[0], score=line[1][1]) for line in result[0]]
+    if on_line is not None:
+        for line in lines:
+            on_line(line)
+    return lines
+
+
+def format_timings(timings):
+    return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items())
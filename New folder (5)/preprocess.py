@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# PaddleOCR's detector resizes to ~960px on the long side anyway; 1600 keeps small print legible
+# while cutting a 300 DPI A4 scan (3500px) to about a fifth of its pixels.
+OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", 1600))
+OCR_ROI_CROP = os.environ.get("OCR_ROI_CROP", "0") == "1"
+ROI_PROFILES_PATH = os.environ.get("ROI_PROFILES_PATH", "roi_profiles.json")
+# Padding around a learned region, as a fraction of the page, so slightly shifted scans still fit.
+ROI_MARGIN = 0.04
+
+EXIF_ORIENTATION = 0x0112
+# EXIF orientation -> (rotation, flip) that brings the pixels upright.
+ORIENTATION_FIXES = {
+    2: (None, 1),
+    3: (cv2.ROTATE_180, None),
+    4: (None, 0),
+    5: (cv2.ROTATE_90_CLOCKWISE, 1),
+    6: (cv2.ROTATE_90_CLOCKWISE, None),
+    7: (cv2.ROTATE_90_COUNTERCLOCKWISE, 1),
+    8: (cv2.ROTATE_90_COUNTERCLOCKWISE, None),
+}
+
+
+def _record(timings, start):
+    if timings is not None:
+        timings["preprocess"] = timings.get("preprocess", 0.0) + (time.perf_counter() - start)
+
+
+# -------------------- Decode & Orientation --------------------
+def exif_orientation(data):
+    try:
+        return Image.open(io.BytesIO(data)).getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
+
+def decode_image(data):
+    """Decode image bytes once into an upright BGR array."""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("Unreadable image")
+    rotation, flip = ORIENTATION_FIXES.get(exif_orientation(data), (None, None))
+    if rotation is not None:
+        image = cv2.rotate(image, rotation)
+    if flip is not None:
+        image = cv2.flip(image, flip)
+    return image
+
+
+# -------------------- Resize & Crop --------------------
+def downscale(image, max_side=OCR_MAX_SIDE):
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width) if max_side else 1.0
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+class ROIProfiles:
+    """Per-document-type regions of interest, stored as page fractions ``[x0, y0, x1, y1]``.
+
+    A region grows to cover the field boxes of every successfully parsed
+    document of that type, so it converges on the part of the page that
+    holds the fields.
+    """
+
+    def __init__(self, path=ROI_PROFILES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.regions = json.load(f)
+        except (OSError, ValueError):
+            self.regions = {}
+
+    def get(self, doc_type):
+        return self.regions.get(doc_type)
+
+    def learn(self, doc_type, boxes, shape):
+        if not boxes:
+            return
+        height, width = shape[:2]
+        points = np.array([point for box in boxes for point in box], dtype=float)
+        region = [
+            max(0.0, points[:, 0].min() / width - ROI_MARGIN),
+            max(0.0, points[:, 1].min() / height - ROI_MARGIN),
+            min(1.0, points[:, 0].max() / width + ROI_MARGIN),
+            min(1.0, points[:, 1].max() / height + ROI_MARGIN),
+        ]
+        with self._lock:
+            known = self.regions.get(doc_type)
+            if known:
+                region = [min(known[0], region[0]), min(known[1], region[1]),
+                          max(known[2], region[2]), max(known[3], region[3])]
+                if region == known:
+                    return
+            self.regions[doc_type] = [round(float(value), 4) for value in region]
+            with open(self.path, "w") as f:
+                json.dump(self.regions, f, indent=2)
+
+
+roi_profiles = ROIProfiles()
+
+
+def crop_roi(image, doc_type):
+    """Crop to the learned region for ``doc_type``; None when nothing has been learned yet."""
+    region = roi_profiles.get(doc_type)
+    if not region:
+        return None
+    height, width = image.shape[:2]
+    x0, y0, x1, y1 = region
+    return image[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+
+
+# -------------------- Pipeline --------------------
+def prepare(image, max_side=OCR_MAX_SIDE, timings=None):
+    """Downscale an already-decoded page (e.g. a rasterized PDF page) for OCR."""
+    start = time.perf_counter()
+    image = downscale(image, max_side)
+    _record(timings, start)
+    return image
+
+
+def load_image(source, max_side=OCR_MAX_SIDE, timings=None):
+    """Decode a file path or uploaded bytes, fix its orientation and downscale it for OCR."""
+    start = time.perf_counter()
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    image = downscale(decode_image(data), max_side)
+    _record(timings, start)
+    return image
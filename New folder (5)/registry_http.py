@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import threading
+from urllib.parse import quote
+
+import httpx
+from lxml import html
+
+import tracing
+
+REGISTRY_HTTP_TIMEOUT = float(os.environ.get("REGISTRY_HTTP_TIMEOUT", 5))
+REGISTRY_HTTP_MAX_CONNECTIONS = int(os.environ.get("REGISTRY_HTTP_MAX_CONNECTIONS", 20))
+# Sources tried over plain HTTP before falling back to a browser; empty disables the HTTP path.
+REGISTRY_HTTP_SOURCES = [s for s in os.environ.get("REGISTRY_HTTP_SOURCES", "zaubacorp,cleartax").split(",") if s]
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+# -------------------- Parsers --------------------
+def text_at(tree, xpath):
+    nodes = tree.xpath(xpath)
+    return nodes[0].text_content().strip() if nodes else None
+
+
+def parse_fields(page, fields):
+    """Read every XPath in ``fields`` from an HTML page; None unless all of them are present."""
+    tree = html.fromstring(page)
+    details = {name: text_at(tree, xpath) for name, xpath in fields.items()}
+    return details if all(details.values()) else None
+
+
+ZAUBACORP_FIELDS = {
+    "Company Name": "//td[p[text()='Company Name']]/following-sibling::td/p",
+    "Date of Incorporation": "//td[p[text()='Date of Incorporation']]/following-sibling::td/p",
+}
+
+CLEARTAX_FIELDS = {
+    "Legal Name": "//span[@id='Business Name']/following-sibling::h4/following-sibling::small",
+    "Constitution of the Business": "//span[@id='Entity Type']/following-sibling::h4/following-sibling::small",
+    "Registration Date": "//span[@id='Registration Date']/following-sibling::h4/following-sibling::small",
+    "PAN": "//span[@id='PAN']/following-sibling::h4/following-sibling::small",
+    "Type of Registration": "//span[@id='Registration Type']/following-sibling::h4/following-sibling::small",
+}
+
+# GSTN taxpayer keys, as embedded in the page's Next.js data when the fields are rendered client-side.
+GSTN_KEYS = {
+    "Legal Name": "lgnm",
+    "Constitution of the Business": "ctb",
+    "Registration Date": "rgdt",
+    "Type of Registration": "dty",
+}
+
+
+def find_record(data, key):
+    if isinstance(data, dict):
+        if key in data:
+            return data
+        data = list(data.values())
+    if isinstance(data, list):
+        for item in data:
+            record = find_record(item, key)
+            if record is not None:
+                return record
+    return None
+
+
+def parse_zaubacorp(page, identifier):
+    return parse_fields(page, ZAUBACORP_FIELDS)
+
+
+def parse_cleartax(page, identifier):
+    details = parse_fields(page, CLEARTAX_FIELDS)
+    if details:
+        return details
+
+    scripts = html.fromstring(page).xpath("//script[@id='__NEXT_DATA__']/text()")
+    record = find_record(json.loads(scripts[0]), "lgnm") if scripts else None
+    if record is None:
+        return None
+    details = {name: str(record.get(key) or "").strip() for name, key in GSTN_KEYS.items()}
+    # Characters 3-12 of a GSTIN are the holder's PAN.
+    details["PAN"] = identifier[2:12]
+    return details if all(details.values()) else None
+
+
+# -------------------- Sources --------------------
+class RegistrySource:
+    def __init__(self, name, base_url, path, parse):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.path = path
+        self.parse = parse
+
+    def url(self, identifier):
+        return self.base_url + self.path.format(identifier=quote(identifier))
+
+
+SOURCES = {}
+
+
+def register_source(source):
+    SOURCES[source.name] = source
+
+
+register_source(RegistrySource(
+    "zaubacorp", os.environ.get("ZAUBACORP_BASE_URL", "https://www.zaubacorp.com"),
+    os.environ.get("ZAUBACORP_LOOKUP_PATH", "/companysearchresults/{identifier}"), parse_zaubacorp))
+register_source(RegistrySource(
+    "cleartax", os.environ.get("CLEARTAX_BASE_URL", "https://cleartax.in"),
+    os.environ.get("CLEARTAX_LOOKUP_PATH", "/gst-number-search/{identifier}/"), parse_cleartax))
+
+
+# -------------------- Client --------------------
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def event_loop():
+    """The background loop that owns the shared HTTP client, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="registry-http", daemon=True).start()
+        return _loop
+
+
+def client():
+    # Only ever called on the background loop, so the pooled connections stay on one loop.
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=REGISTRY_HTTP_TIMEOUT,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=REGISTRY_HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=REGISTRY_HTTP_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def fetch(source_name, identifier):
+    source = SOURCES[source_name]
+    response = await client().get(source.url(identifier))
+    response.raise_for_status()
+    return source.parse(response.text, identifier)
+
+
+def fetch_sync(source_name, identifier):
+    future = asyncio.run_coroutine_threadsafe(fetch(source_name, identifier), event_loop())
+    return future.result(timeout=REGISTRY_HTTP_TIMEOUT * 2)
+
+
+def lookup(source_name, identifier, fallback=None):
+    """Look a company up over HTTP, falling back to ``fallback(identifier)`` (the Selenium scraper)."""
+    if source_name in REGISTRY_HTTP_SOURCES and source_name in SOURCES:
+        try:
+            with tracing.span(f"registry.http.{source_name}"):
+                details = fetch_sync(source_name, identifier)
+            if details:
+                return details
+        except Exception as e:
+            print(f"HTTP lookup on {source_name} failed, falling back: {e!r}")
+    if fallback is None:
+        return None
+    with tracing.span(f"registry.browser.{source_name}"):
+        return fallback(identifier)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import lookup_scheduler
+
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", "cache.sqlite3")
+# Registry records change rarely; a day keeps repeat verifications fast without serving stale data for long.
+REGISTRY_CACHE_TTL = float(os.environ.get("REGISTRY_CACHE_TTL", 24 * 60 * 60))
+CACHE_MEMORY_SIZE = int(os.environ.get("CACHE_MEMORY_SIZE", 256))
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", 5000))
+
+
+# -------------------- Two-tier Cache --------------------
+def connect(path):
+    db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL lets the worker processes of a multi-process server read while one of them writes.
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
+
+
+class ResultCache:
+    """JSON-serializable results kept in an in-memory LRU on top of SQLite.
+
+    Entries older than ``ttl`` seconds are treated as missing. When
+    ``max_entries`` is set, the oldest entries are evicted from SQLite once
+    the namespace grows past it. ``None`` is never cached, so failed lookups
+    are retried on the next call.
+    """
+
+    def __init__(self, namespace, ttl=None, memory_size=CACHE_MEMORY_SIZE, max_entries=None, path=CACHE_DB_PATH):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self.path = path
+        self.stats = Counter()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connection(self):
+        # Opened on first use, with the lock held, so importing an app doesn't create the cache file.
+        if self._db is None:
+            self._db = connect(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def reopen(self):
+        """Reconnect on next use; forked worker processes must not keep using their parent's connection."""
+        with self._lock:
+            self._db = None
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+
+            row = self._connection().execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.stats["disk_hits"] += 1
+                return value
+
+            if row is not None:
+                self._delete(key)
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        if value is None:
+            return
+        created_at = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), created_at),
+            )
+            if self.max_entries is not None:
+                self._evict()
+            db.commit()
+            self._remember(key, value, created_at)
+
+    def _evict(self):
+        evicted = self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        ).rowcount
+        self.stats["evictions"] += evicted
+
+    def _delete(self, key):
+        self._memory.pop(key, None)
+        db = self._connection()
+        db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+        db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+
+    def get_or_compute(self, key, compute, refresh=False):
+        if refresh:
+            self.stats["refreshes"] += 1
+        else:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def snapshot(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return dict(self.stats, hit_ratio=hits / lookups if lookups else 0.0)
+
+
+# -------------------- Registry Lookups --------------------
+registry_cache = ResultCache("registry", ttl=REGISTRY_CACHE_TTL)
+
+
+def normalize_identifier(identifier):
+    return "".join(identifier.split()).upper()
+
+
+def cached_lookup(source, identifier, fetch, refresh=False):
+    """Return ``fetch(identifier)`` for a CIN/LLPIN/GSTIN, served from the cache when fresh.
+
+    Cache misses go through the source's ``lookup_scheduler``, so this raises
+    ``RegistryUnavailable`` when the registry can't be reached in time.
+    """
+    identifier = normalize_identifier(identifier)
+    return registry_cache.get_or_compute(
+        f"{source}:{identifier}", lambda: lookup_scheduler.lookup(source, identifier, fetch), refresh=refresh)
+
+
+# -------------------- OCR Results --------------------
+# Keyed by parser name and version as well as content, so bumping a parser's
+# PARSER_VERSION after a regex change stops old entries from being served.
+ocr_cache = ResultCache("ocr", max_entries=OCR_CACHE_MAX_ENTRIES)
+
+
+def content_hash(data):
+    """SHA-256 of uploaded bytes or of a file-like object, which is rewound afterwards."""
+    digest = hashlib.sha256()
+    if isinstance(data, bytes):
+        digest.update(data)
+    else:
+        for chunk in iter(lambda: data.read(1 << 16), b""):
+            digest.update(chunk)
+        data.seek(0)
+    return digest.hexdigest()
+
+
+def cached_parse(parser_name, parser_version, digest, parse, refresh=False):
+    """Return ``parse()`` for an uploaded document, served from the cache for repeat uploads."""
+    return ocr_cache.get_or_compute(f"{parser_name}:{parser_version}:{digest}", parse, refresh=refresh)
@@ -0,0 +1,178 @@
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import tracing
+
+# Selenium and webdriver_manager are imported where they're used, so an app
+# importing this module can start serving before either is loaded.
+
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", 2))
+# Chrome leaks memory over long sessions, so each browser is restarted after this many lookups.
+BROWSER_MAX_USES = int(os.environ.get("BROWSER_MAX_USES", 50))
+BROWSER_CHECKOUT_TIMEOUT = float(os.environ.get("BROWSER_CHECKOUT_TIMEOUT", 30))
+BROWSER_PAGE_LOAD_TIMEOUT = float(os.environ.get("BROWSER_PAGE_LOAD_TIMEOUT", 30))
+# How long a scraper waits for an element to appear before the lookup counts as failed.
+BROWSER_WAIT_TIMEOUT = float(os.environ.get("BROWSER_WAIT_TIMEOUT", 10))
+
+
+class BrowserPoolBusy(Exception):
+    pass
+
+
+def chrome_options():
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920x1080")
+    return options
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+    def is_alive(self):
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print("Error closing browser:", e)
+
+
+# -------------------- Browser Pool --------------------
+class BrowserPool:
+    """Fixed number of headless Chrome sessions reused across lookups.
+
+    ``session()`` blocks for at most ``checkout_timeout`` seconds when every
+    browser is busy and then raises ``BrowserPoolBusy``. A browser that stops
+    responding is replaced, and every browser is recycled after ``max_uses``
+    checkouts. No more than ``size`` browsers exist at once, counting idle,
+    checked-out and still-launching ones, even while ``start()`` runs
+    alongside lookups.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES,
+                 checkout_timeout=BROWSER_CHECKOUT_TIMEOUT, page_load_timeout=BROWSER_PAGE_LOAD_TIMEOUT):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+        self.page_load_timeout = page_load_timeout
+        self._idle = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._driver_path = None
+        self._lock = threading.Lock()
+        self._created = 0
+        self._created_lock = threading.Lock()
+
+    def _chromedriver(self):
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        # Resolve the driver binary once instead of on every lookup.
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+            return self._driver_path
+
+    def _reserve_slot(self):
+        with self._created_lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _discard(self, session):
+        session.quit()
+        with self._created_lock:
+            self._created -= 1
+
+    def _launch(self):
+        """Start a browser in a slot already reserved with ``_reserve_slot``, giving the slot back on failure."""
+        try:
+            return self._start_browser()
+        except Exception:
+            with self._created_lock:
+                self._created -= 1
+            raise
+
+    def _start_browser(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        with tracing.span("browser.launch"):
+            driver = webdriver.Chrome(service=Service(self._chromedriver()), options=chrome_options())
+        driver.set_page_load_timeout(self.page_load_timeout)
+        driver.set_script_timeout(self.page_load_timeout)
+        return BrowserSession(driver)
+
+    def start(self):
+        """Launch browsers until the pool is full."""
+        while self._reserve_slot():
+            self._idle.put(self._launch())
+
+    def _take_idle(self, timeout):
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_slot():
+                    return self._launch()
+                # Every browser exists; the free one is still being launched by start().
+                try:
+                    session = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise BrowserPoolBusy(f"No browser became free within {timeout} seconds")
+            if session.is_alive():
+                return session
+            self._discard(session)
+
+    @contextmanager
+    def session(self):
+        with tracing.span("browser.checkout_wait"):
+            acquired = self._slots.acquire(timeout=self.checkout_timeout)
+        if not acquired:
+            raise BrowserPoolBusy(f"All {self.size} browsers busy for {self.checkout_timeout} seconds")
+        session = None
+        healthy = True
+        try:
+            session = self._take_idle(self.checkout_timeout)
+            session.uses += 1
+            yield session.driver
+        except Exception:
+            # Lookup errors (element not found, wait timeouts) leave a usable browser;
+            # only replace it when the browser itself stopped responding.
+            healthy = session is not None and session.is_alive()
+            raise
+        finally:
+            if session is not None:
+                if healthy and session.uses < self.max_uses:
+                    self._idle.put(session)
+                else:
+                    self._discard(session)
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+pool = BrowserPool()
+atexit.register(pool.close)
@@ -0,0 +1,122 @@
+"""Production launcher: loads an app and its OCR models once, then forks worker processes.
+
+    python serve.py service --workers 4 --bind 0.0.0.0:8000
+    python serve.py main --workers 2
+
+The models are loaded in the master before forking, so the workers share
+their weights copy-on-write instead of each loading its own copy; with
+``SERVE_PRELOAD_OCR=0`` each worker instead loads its own in the background
+and answers ``/healthz`` straight away, which starts faster but uses more
+memory. Browsers are always started per worker, in the background. The
+machine's cores are split between the workers so their inference threads
+don't oversubscribe the CPU. Send the master SIGHUP to replace every worker
+gracefully; a worker that dies or hangs past ``--timeout`` is replaced
+automatically.
+"""
+import argparse
+import os
+import tempfile
+
+# Flask apps run on threads in each worker; main3 and service are ASGI and run on uvicorn's event loop.
+WORKER_CLASSES = {"main": "gthread", "main2": "gthread", "main3": "uvicorn.workers.UvicornWorker",
+                  "service": "uvicorn.workers.UvicornWorker"}
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", os.cpu_count() or 1))
+SERVE_BIND = os.environ.get("SERVE_BIND", "0.0.0.0:8000")
+SERVE_TIMEOUT = int(os.environ.get("SERVE_TIMEOUT", 120))
+SERVE_GRACEFUL_TIMEOUT = int(os.environ.get("SERVE_GRACEFUL_TIMEOUT", 60))
+# Recycle a worker after this many requests (with jitter) to bound slow leaks; 0 never recycles.
+SERVE_MAX_REQUESTS = int(os.environ.get("SERVE_MAX_REQUESTS", 0))
+SERVE_PRELOAD_OCR = os.environ.get("SERVE_PRELOAD_OCR", "1") == "1"
+
+
+def configure_environment(workers):
+    """Per-worker CPU budget and shared state, set before the app (and Paddle) is imported."""
+    # Concurrency comes from the worker processes, so one engine per worker is the default.
+    os.environ.setdefault("OCR_POOL_SIZE", "1")
+    engines = workers * max(1, int(os.environ["OCR_POOL_SIZE"]))
+    threads = str(max(1, (os.cpu_count() or 1) // engines))
+    os.environ.setdefault("OCR_CPU_THREADS", threads)
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(name, threads)
+    if workers > 1:
+        # A job's status may be polled on a different worker than the one running it.
+        os.environ.setdefault("JOB_STORE_PATH", os.environ.get("CACHE_DB_PATH", "cache.sqlite3"))
+        # Each worker writes its metrics here so /metrics on any worker reports all of them.
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="ocr-metrics-"))
+
+
+def post_fork(server, worker):
+    import result_cache
+    import verification_store
+    import warmup
+
+    # SQLite connections and browser processes can't be shared across a fork.
+    result_cache.registry_cache.reopen()
+    result_cache.ocr_cache.reopen()
+    # Preloaded OCR engines are already warm; the browsers start while the worker serves.
+    warmup.start()
+    # Each worker only re-checks the records it claims, so running it in every worker is safe.
+    verification_store.start_scheduler()
+
+
+def worker_exit(server, worker):
+    import jobs
+    import scraper_pool
+
+    jobs.jobs.shutdown()
+    scraper_pool.pool.close()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("app", choices=sorted(WORKER_CLASSES))
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--bind", default=SERVE_BIND)
+    parser.add_argument("--timeout", type=int, default=SERVE_TIMEOUT)
+    args = parser.parse_args()
+
+    configure_environment(args.workers)
+
+    import importlib
+
+    from gunicorn.app.base import BaseApplication
+
+    import ocr_engine
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": args.bind,
+                "workers": args.workers,
+                "worker_class": WORKER_CLASSES[args.app],
+                "threads": 8,
+                "preload_app": True,
+                "timeout": args.timeout,
+                "graceful_timeout": SERVE_GRACEFUL_TIMEOUT,
+                "max_requests": SERVE_MAX_REQUESTS,
+                "max_requests_jitter": SERVE_MAX_REQUESTS // 10,
+                "post_fork": post_fork,
+                "worker_exit": worker_exit,
+                "child_exit": child_exit,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            app = importlib.import_module(args.app).app
+            if SERVE_PRELOAD_OCR:
+                # Only builds the engines; no inference runs in the master, so no Paddle threads exist before the fork.
+                ocr_engine.pool.warm_up()
+            return app
+
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
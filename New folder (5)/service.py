@@ -0,0 +1,119 @@
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+import doc_router
+import jobs
+import lookup_scheduler
+import result_cache
+import scraper_pool
+import tracing
+import upload_store
+import verification_store
+import warmup
+
+# One service for every certificate type: uploads are classified after OCR and
+# routed to that type's parser and registry, sharing one OCR pool and one browser pool.
+app = FastAPI()
+templates = Jinja2Templates(directory="templates")
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "pdf"}
+RESULT_TEMPLATES = {"incorporation": "result2.html", "gst": "result.html"}
+
+def allowed_file(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@app.on_event("startup")
+def start_pools():
+    warmup.start()
+
+@app.on_event("shutdown")
+def stop_pools():
+    scraper_pool.pool.close()
+
+@app.get("/", response_class=HTMLResponse)
+async def upload_file(request: Request):
+    return templates.TemplateResponse("upload_document.html", {"request": request})
+
+@app.get("/next_step", response_class=HTMLResponse)
+async def next_step(request: Request):
+    return templates.TemplateResponse("upload_document.html", {"request": request})
+
+@app.post("/upload/")
+async def upload_document(request: Request, file: UploadFile = File(...), refresh: bool = False):
+    if not allowed_file(file.filename):
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    with tracing.trace():
+        try:
+            with tracing.span("upload.read"):
+                content = await run_in_threadpool(upload_store.read_upload, file.file)
+                digest = await run_in_threadpool(result_cache.content_hash, content)
+        except upload_store.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        with tracing.span("upload.save"):
+            await run_in_threadpool(upload_store.audit_copy, content, digest, file.filename)
+
+        job = jobs.jobs.submit(doc_router.verify_document, content, file.filename, digest, refresh)
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({"job_id": job.id, "status_url": f"/jobs/{job.id}/status"}, status_code=202)
+    return RedirectResponse(url=f"/jobs/{job.id}", status_code=303)
+
+def get_job(job_id):
+    job = jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_class=HTMLResponse)
+async def show_job(request: Request, job_id: str):
+    job = get_job(job_id)
+    if job.status == jobs.DONE:
+        template = RESULT_TEMPLATES.get(job.result.get("doc_type"), "result.html")
+        return templates.TemplateResponse(template, {"request": request, **job.result})
+    if job.status == jobs.FAILED:
+        return templates.TemplateResponse("result.html", {
+            "request": request,
+            "validation_message": f"Error processing file: {job.error}"
+        })
+    return templates.TemplateResponse("job_status.html", {"request": request, "job": job})
+
+@app.get("/jobs/{job_id}/status")
+async def job_status(job_id: str, timings: bool = False):
+    return get_job(job_id).to_dict(timings=timings)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Starlette iterates this blocking generator in its thread pool.
+    return StreamingResponse(jobs.jobs.events(get_job(job_id)), media_type="text/event-stream")
+
+@app.get("/verifications")
+async def verification_history(cin: str = None, gstin: str = None, pan: str = None, digest: str = None,
+                               limit: int = verification_store.HISTORY_LIMIT):
+    # Every verification of a CIN/LLPIN, GSTIN, PAN or document hash, newest first.
+    return {"verifications": verification_store.store.history(cin, gstin, pan, digest, limit)}
+
+@app.get("/verifications/{verification_id}")
+async def verification(verification_id: int):
+    record = verification_store.store.get(verification_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Verification not found")
+    return record
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return {"registry": result_cache.registry_cache.snapshot(), "ocr": result_cache.ocr_cache.snapshot(),
+            "lookups": lookup_scheduler.snapshot()}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=tracing.metrics(), media_type=tracing.CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    return warmup.liveness()
+
+@app.get("/readyz")
+async def readyz():
+    status = warmup.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
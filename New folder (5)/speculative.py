@@ -0,0 +1,52 @@
+import contextvars
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import lookup_scheduler
+import result_cache
+
+SPECULATIVE_LOOKUP = os.environ.get("SPECULATIVE_LOOKUP", "1") == "1"
+SPECULATIVE_LOOKUP_WORKERS = int(os.environ.get("SPECULATIVE_LOOKUP_WORKERS", 4))
+
+# Shapes of the identifiers the registries are searched by, anywhere in an OCR line.
+CIN_RE = re.compile(r"(?<![A-Z0-9])[LU]\d{5}[A-Z]{2}\d{4}[A-Z]{3}\d{6}(?![A-Z0-9])")
+GSTIN_RE = re.compile(r"(?<![A-Z0-9])\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z](?![A-Z0-9])")
+
+_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_LOOKUP_WORKERS, thread_name_prefix="speculative-lookup")
+
+
+class LookupPrefetch:
+    """Starts a registry lookup from the OCR line stream as soon as an identifier shows up.
+
+    Pass ``feed`` as the ``on_line`` callback of ``ocr_engine.read_lines``:
+    the first line matching ``pattern`` submits ``lookup(identifier)``, which
+    then runs while the rest of the page is still being recognized.
+    ``resolve`` hands back that result when the parser settled on the same
+    identifier, and otherwise looks the parsed identifier up itself.
+    """
+
+    def __init__(self, pattern, lookup):
+        self.pattern = pattern
+        self.lookup = lookup
+        self.identifier = None
+        self._future = None
+
+    def feed(self, line):
+        if self._future is not None or not SPECULATIVE_LOOKUP:
+            return
+        match = self.pattern.search(line.text)
+        if match:
+            self.identifier = match.group(0)
+            self._future = _executor.submit(contextvars.copy_context().run, self.lookup, self.identifier)
+
+    def resolve(self, identifier):
+        if self._future is not None and (result_cache.normalize_identifier(self.identifier)
+                                         == result_cache.normalize_identifier(identifier)):
+            try:
+                return self._future.result()
+            except lookup_scheduler.RegistryUnavailable:
+                raise
+            except Exception as e:
+                print(f"Speculative lookup for {identifier} failed, retrying: {e!r}")
+        return self.lookup(identifier)
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The modules under test live in the folder above, alongside the apps.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the caches and verification history a test run writes out of the real ones.
+_scratch = tempfile.mkdtemp(prefix="ocr-tests-")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_scratch, "cache.sqlite3"))
+os.environ.setdefault("VERIFICATION_DB_PATH", os.path.join(_scratch, "verifications.sqlite3"))
+os.environ.setdefault("UPLOAD_AUDIT", "0")
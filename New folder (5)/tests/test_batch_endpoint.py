@@ -0,0 +1,68 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("fitz")
+
+import main  # noqa: E402
+
+
+def fake_extract(data, filename, digest, on_line=None):
+    return ("ACME SOFTWARE PRIVATE LIMITED", "21 March 2019", "U72900KA2019PTC123456", "AABCA1234C", "RAMESH KUMAR")
+
+
+def fake_validate(details, refresh=False, prefetch=None):
+    company_name, date_of_incorporation, llpin, pan, signature = details
+    return dict(company_name=company_name, date_of_incorporation=date_of_incorporation, llpin=llpin, pan=pan,
+                digital_signature_name=signature, validation_status="Valid",
+                gst_details={"Company Name": company_name, "Date of Incorporation": date_of_incorporation},
+                field_matches=None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No OCR models or registry: only the upload handling and streaming are under test.
+    monkeypatch.setattr(main, "extract_document", fake_extract)
+    monkeypatch.setattr(main, "validate_document", fake_validate)
+    return main.app.test_client()
+
+
+def archive(*names):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        for name in names:
+            zf.writestr(name, b"scan of " + name.encode())
+        zf.writestr("notes.txt", b"not a certificate")
+    data.seek(0)
+    return data
+
+
+def test_batch_streams_a_row_per_document(client):
+    response = client.post("/batch", data={"file": (archive("a.jpg", "b.png"), "batch.zip")})
+    assert response.status_code == 200
+    # Reading the body runs the generator, after the view (and its request) has finished.
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(row["file"] for row in rows) == ["a.jpg", "b.png"]
+    assert all(row["validation_status"] == "Valid" and "error" not in row for row in rows)
+
+
+def test_batch_csv(client):
+    response = client.post("/batch", data={"file": (archive("a.jpg"), "batch.zip"), "format": "csv"})
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("file,company_name,")
+    assert lines[1].startswith("a.jpg,ACME SOFTWARE PRIVATE LIMITED,")
+
+
+def test_batch_rejects_non_zip(client):
+    response = client.post("/batch", data={"file": (io.BytesIO(b"plain text"), "batch.zip")})
+    assert response.status_code == 400
+
+
+def test_batch_rejects_oversized_documents(client, monkeypatch):
+    check_archive = main.batch.check_archive
+    monkeypatch.setattr(main.batch, "check_archive", lambda source: check_archive(source, max_document=10))
+    response = client.post("/batch", data={"file": (archive("a.jpg"), "batch.zip")})
+    assert response.status_code == 413
@@ -0,0 +1,127 @@
+from datetime import date
+
+import pytest
+
+import field_match
+
+
+# -------------------- Dates --------------------
+@pytest.mark.parametrize("text", [
+    "First day of January Two thousand nineteen", "01 January 2019", "1st January 2019", "01/01/2019",
+    "01-01-2019", "2019-01-01", "01-Jan-2019", "January 1, 2019",
+])
+def test_canonical_date(text):
+    assert field_match.canonical_date(text) == date(2019, 1, 1)
+
+
+@pytest.mark.parametrize("text", [None, "", "Date not found", "31/02/2019"])
+def test_canonical_date_unreadable(text):
+    assert field_match.canonical_date(text) is None
+
+
+def test_dates_match_across_formats():
+    match = field_match.compare_dates("Twenty-first day of March Two thousand nineteen", "21/03/2019")
+    assert match.matched and match.score == 1.0
+
+
+def test_dates_are_read_day_first():
+    match = field_match.compare_dates("03/04/2019", "3 April 2019")
+    assert match.matched
+    assert not field_match.compare_dates("03/04/2019", "4 March 2019").matched
+
+
+def test_different_dates():
+    match = field_match.compare_dates("21/03/2019", "22/03/2019")
+    assert not match.matched
+    assert "2019-03-21" in match.reason and "2019-03-22" in match.reason
+
+
+def test_unreadable_date_does_not_match():
+    match = field_match.compare_dates("sometime in March", "21/03/2019")
+    assert not match.matched and "could not read" in match.reason
+
+
+# -------------------- Names --------------------
+@pytest.mark.parametrize("text, normalized", [
+    ("M/s. Acme Software Pvt. Ltd.", "ACME SOFTWARE PRIVATE LIMITED"),
+    ("The Acme Co.", "ACME COMPANY"),
+    ("Smith & Sons (P) Ltd", "SMITH AND SONS P LIMITED"),
+    ("ALEP MANAGEMENT L.L.P.", "ALEP MANAGEMENT LLP"),
+    ("Alep Management Limited Liability Partnership", "ALEP MANAGEMENT LLP"),
+])
+def test_normalize_name(text, normalized):
+    assert field_match.normalize_name(text) == normalized
+
+
+@pytest.mark.parametrize("ocr, registry", [
+    ("M/s. Acme Software Pvt. Ltd.", "ACME SOFTWARE PRIVATE LIMITED"),
+    ("ALEP MANAGEMENT L.L.P.", "ALEP MANAGEMENT LLP"),
+    # Spacing lost and digits misread for letters by OCR.
+    ("ACMESOFTWARE PRIVATE LIMITED", "ACME SOFTWARE PRIVATE LIMITED"),
+    ("ACME S0FTWARE PRIVATE LIMITED", "ACME SOFTWARE PRIVATE LIMITED"),
+    # One misread letter in a long word.
+    ("BHARAT HEAVY ELECTRICALZ LIMITED", "BHARAT HEAVY ELECTRICALS LIMITED"),
+    ("SOFTWARE ACME PRIVATE LIMITED", "ACME SOFTWARE PRIVATE LIMITED"),
+])
+def test_same_company(ocr, registry):
+    assert field_match.compare_names(ocr, registry).matched
+
+
+@pytest.mark.parametrize("ocr, registry", [
+    # The shared legal form must not carry a different distinctive name over the threshold.
+    ("ABC PRIVATE LIMITED", "ABD PRIVATE LIMITED"),
+    ("AB INFRA PRIVATE LIMITED", "AK INFRA PRIVATE LIMITED"),
+    ("XYZ LLP", "XY LLP"),
+    ("ABC INFRA PROJECTS PVT LTD", "ABD INFRA PROJECTS PVT LTD"),
+    ("ACME SOFTWARE SOLUTIONS PRIVATE LIMITED", "ACME SOFTWARE PRIVATE LIMITED"),
+    # Shortened words that aren't legal forms name a different company.
+    ("ACME TECH PRIVATE LIMITED", "ACME TECHNOLOGIES PRIVATE LIMITED"),
+    ("ACME INTL PRIVATE LIMITED", "ACME INTERNATIONAL PRIVATE LIMITED"),
+])
+def test_different_company(ocr, registry):
+    match = field_match.compare_names(ocr, registry)
+    assert not match.matched
+    assert "different" in match.reason
+
+
+def test_legal_form_must_match_exactly():
+    match = field_match.compare_names("ACME SOFTWARE LIMITED", "ACME SOFTWARE PRIVATE LIMITED")
+    assert not match.matched and "legal form" in match.reason
+    assert not field_match.compare_names("ACME LLP", "ACME PRIVATE LIMITED").matched
+
+
+def test_split_legal_form():
+    assert field_match.split_legal_form("ACME COMPANY PRIVATE LIMITED") == (["ACME"], "COMPANY PRIVATE LIMITED")
+    assert field_match.split_legal_form("ACME SOFTWARE") == (["ACME", "SOFTWARE"], "")
+
+
+@pytest.mark.parametrize("ocr, registry, reason", [
+    ("COMPANY NAME NOT FOUND", None, "not found in the registry"),
+    (None, "ACME PRIVATE LIMITED", "not found on the certificate"),
+    ("", "ACME PRIVATE LIMITED", "not found on the certificate"),
+])
+def test_missing_values_never_match(ocr, registry, reason):
+    match = field_match.compare_names(ocr, registry)
+    assert not match.matched and match.reason == reason
+
+
+# -------------------- Text --------------------
+def test_text_ignores_case_and_punctuation_only():
+    assert field_match.compare_text("Private Limited  Company", "PRIVATE LIMITED COMPANY.").matched
+    # No company-name synonyms or fuzzy matching for plain text.
+    assert not field_match.compare_text("Pvt Ltd Company", "Private Limited Company").matched
+    assert not field_match.compare_text("Proprietorship", "Partnership").matched
+
+
+# -------------------- Compare --------------------
+def test_compare_dispatches_by_kind():
+    matches = field_match.compare([
+        ("name", field_match.NAME, "Acme Pvt Ltd", "ACME PRIVATE LIMITED"),
+        ("date", field_match.DATE, "01/01/2019", "2019-01-01"),
+        ("constitution", field_match.TEXT, "Private Ltd Company", "Private Limited Company"),
+    ])
+    assert {field: match.matched for field, match in matches.items()} == {
+        "name": True, "date": True, "constitution": False}
+    assert not field_match.all_matched(matches)
+    assert field_match.explain(matches)["date"] == {
+        "matched": True, "score": 1.0, "ocr": "01/01/2019", "registry": "2019-01-01", "reason": "same date (2019-01-01)"}
@@ -0,0 +1,81 @@
+import pytest
+
+import incorporation_fields
+
+CERTIFICATE_TEXT = (
+    "I hereby certify that ACME Software Private Limited is incorporated on this Twenty-first day of March "
+    "Two thousand nineteen under the Companies Act, 2013 (18 of 2013). The Corporate Identity Number of the "
+    "company is U72900KA2019PTC123456. The Permanent Account Number(PAN)of the company is AABCA1234C. "
+    "Digital Signature Certificate RAMESH KUMAR For and on behalf of the Jurisdictional Registrar of Companies"
+)
+
+
+@pytest.mark.parametrize("words, number", [
+    ("nineteen", 19),
+    ("Twenty-one", 21),
+    ("two thousand nineteen", 2019),
+    ("two thousand and twenty-one", 2021),
+    ("one thousand nine hundred ninety nine", 1999),
+    ("two thousand fourteen", 2014),
+])
+def test_words_to_number(words, number):
+    assert incorporation_fields.words_to_number(words) == number
+
+
+@pytest.mark.parametrize("words", ["", "two thousand nineteenth", "twenty banana"])
+def test_words_to_number_rejects_unknown_words(words):
+    assert incorporation_fields.words_to_number(words) is None
+
+
+@pytest.mark.parametrize("text, date", [
+    ("this First day of January Two thousand nineteen", "01 January 2019"),
+    ("Twenty-first day of March Two thousand nineteen", "21 March 2019"),
+    ("twenty first day of march two thousand and twenty", "21 March 2020"),
+    ("Thirty first day of December 2021", "31 December 2021"),
+    # The year stops at the first word that isn't a number.
+    ("Second day of June Two thousand twelve under the Act", "02 June 2012"),
+])
+def test_parse_date_in_words(text, date):
+    assert incorporation_fields.parse_date_in_words(text) == date
+
+
+@pytest.mark.parametrize("text", [
+    "day of January Two thousand nineteen",  # no day
+    "First day of Two thousand nineteen",  # no month
+    "First day of January",  # no year
+    "First day of January seventeen",  # not a plausible year
+])
+def test_parse_date_in_words_incomplete(text):
+    assert incorporation_fields.parse_date_in_words(text) is None
+
+
+def test_extract_fields():
+    assert incorporation_fields.extract_fields(CERTIFICATE_TEXT) == {
+        "company_name": "ACME SOFTWARE PRIVATE LIMITED",
+        "date_of_incorporation": "21 March 2019",
+        "llpin": "U72900KA2019PTC123456",
+        "pan": "AABCA1234C",
+        "digital_signature_name": "RAMESH KUMAR",
+    }
+
+
+def test_missing_fields_get_their_placeholder():
+    fields = incorporation_fields.extract_fields("The Corporate Identity Number of the company is U72900KA2019PTC123456.")
+    assert fields["llpin"] == "U72900KA2019PTC123456"
+    assert {name: value for name, value in fields.items() if name != "llpin"} == {
+        "company_name": "COMPANY NAME NOT FOUND",
+        "date_of_incorporation": "Date not found",
+        "pan": "PAN not found",
+        "digital_signature_name": "Digital Signature Name not found",
+    }
+    assert set(fields.values()) - {"U72900KA2019PTC123456"} <= incorporation_fields.NOT_FOUND
+
+
+def test_unreadable_date_is_not_found():
+    text = CERTIFICATE_TEXT.replace("Twenty-first day of March", "Twenty-first day of")
+    assert incorporation_fields.extract_fields(text)["date_of_incorporation"] == "Date not found"
+
+
+def test_parse_certificate_text_order():
+    assert incorporation_fields.parse_certificate_text(CERTIFICATE_TEXT) == (
+        "ACME SOFTWARE PRIVATE LIMITED", "21 March 2019", "U72900KA2019PTC123456", "AABCA1234C", "RAMESH KUMAR")
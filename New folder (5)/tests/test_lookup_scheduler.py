@@ -0,0 +1,224 @@
+import threading
+import time
+
+import pytest
+
+import lookup_scheduler
+import registry_http
+import scraper_pool
+from lookup_scheduler import CircuitBreaker, LookupScheduler, RegistryUnavailable, TokenBucket
+
+
+def make_scheduler(**overrides):
+    settings = dict(rate=1000, burst=10, max_wait=1, retries=2, backoff=0.001, deadline=2,
+                    breaker_threshold=3, breaker_cooldown=60)
+    settings.update(overrides)
+    return LookupScheduler("test", **settings)
+
+
+def failing(identifier):
+    raise ConnectionError("registry down")
+
+
+def eventually(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# -------------------- Token Bucket --------------------
+def test_bucket_allows_a_burst_then_spaces_calls_out():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve(max_wait=1) for _ in range(3)] == [0, 0, 0]
+    first, second = bucket.reserve(max_wait=1), bucket.reserve(max_wait=1)
+    assert first == pytest.approx(0.1, abs=0.01)
+    # Each queued caller waits behind the ones before it.
+    assert second == pytest.approx(0.2, abs=0.01)
+
+
+def test_bucket_turns_callers_away_instead_of_queueing_past_max_wait():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.reserve(max_wait=0.5) == 0
+    assert bucket.reserve(max_wait=0.5) is None
+    # Being turned away takes no token, so the next caller's wait doesn't grow.
+    assert bucket.reserve(max_wait=2) == pytest.approx(1, abs=0.01)
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(rate=100, burst=1)
+    bucket.reserve(max_wait=1)
+    time.sleep(0.02)
+    assert bucket.reserve(max_wait=0) == 0
+
+
+# -------------------- Circuit Breaker --------------------
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.failed()
+    assert breaker.allow() and not breaker.is_open
+    breaker.failed()
+    assert breaker.is_open and not breaker.allow()
+
+
+def test_breaker_success_resets_the_count():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.failed()
+    breaker.succeeded()
+    breaker.failed()
+    assert not breaker.is_open
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.failed()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    # Everyone else keeps failing fast until the trial reports back.
+    assert not breaker.allow()
+    breaker.succeeded()
+    assert breaker.allow() and not breaker.is_open
+
+
+# -------------------- Scheduler --------------------
+def test_not_found_is_a_success():
+    scheduler = make_scheduler(breaker_threshold=1)
+    calls = []
+
+    def not_found(identifier):
+        calls.append(identifier)
+        return None
+
+    for _ in range(3):
+        assert scheduler.lookup("U00000XX0000PTC000000", not_found) is None
+    # Never retried, never held against the source.
+    assert len(calls) == 3
+    assert not scheduler.breaker.is_open
+    assert scheduler.lookup("U72900KA2019PTC123456", lambda identifier: {"Company Name": "ACME"}) == {"Company Name": "ACME"}
+
+
+def test_failures_are_retried_then_reported_unavailable():
+    scheduler = make_scheduler(retries=2, breaker_threshold=10)
+    calls = []
+
+    def fetch(identifier):
+        calls.append(identifier)
+        raise ConnectionError("registry down")
+
+    with pytest.raises(RegistryUnavailable):
+        scheduler.lookup("A", fetch)
+    assert len(calls) == 3
+
+
+def test_retry_recovers_from_a_transient_failure():
+    scheduler = make_scheduler()
+    attempts = []
+
+    def flaky(identifier):
+        attempts.append(identifier)
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return {"Legal Name": "ACME"}
+
+    assert scheduler.lookup("A", flaky) == {"Legal Name": "ACME"}
+    assert scheduler.breaker.failures == 0
+
+
+def test_open_circuit_fails_fast_without_fetching():
+    scheduler = make_scheduler(retries=0, breaker_threshold=2)
+    for identifier in ("A", "B"):
+        with pytest.raises(RegistryUnavailable):
+            scheduler.lookup(identifier, failing)
+    calls = []
+    with pytest.raises(RegistryUnavailable, match="failing"):
+        scheduler.lookup("C", lambda identifier: calls.append(identifier))
+    assert calls == []
+
+
+def test_full_rate_limit_queue_is_unavailable():
+    scheduler = make_scheduler(rate=0.1, burst=1, max_wait=0.1)
+    scheduler.lookup("A", lambda identifier: {})
+    with pytest.raises(RegistryUnavailable, match="rate limit"):
+        scheduler.lookup("B", lambda identifier: {})
+
+
+def test_deadline_bounds_a_hanging_attempt():
+    scheduler = make_scheduler(deadline=0.2)
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(RegistryUnavailable, match="did not answer"):
+        scheduler.lookup("A", lambda identifier: release.wait(5))
+    assert time.monotonic() - started < 1
+    release.set()
+
+
+def test_abandoned_attempt_counts_against_the_source_only_if_it_fails():
+    scheduler = make_scheduler(deadline=0.1, breaker_threshold=10)
+    release = threading.Event()
+
+    def hangs_then_fails(identifier):
+        release.wait(5)
+        raise ConnectionError("registry down")
+
+    with pytest.raises(RegistryUnavailable, match="did not answer"):
+        scheduler.lookup("A", hangs_then_fails)
+    assert scheduler.breaker.failures == 0
+    release.set()
+    assert eventually(lambda: scheduler.breaker.failures == 1)
+
+    # Finishing late but successfully clears the failure instead of adding one.
+    with pytest.raises(RegistryUnavailable, match="did not answer"):
+        scheduler.lookup("B", lambda identifier: time.sleep(0.2))
+    assert eventually(lambda: scheduler.breaker.failures == 0)
+
+
+def test_lookup_slower_than_one_element_wait_still_succeeds():
+    # The default deadline leaves room for the HTTP try and a page load as well as the element waits.
+    assert lookup_scheduler.LOOKUP_DEADLINE > (registry_http.REGISTRY_HTTP_TIMEOUT * 2
+                                               + scraper_pool.BROWSER_PAGE_LOAD_TIMEOUT
+                                               + scraper_pool.BROWSER_WAIT_TIMEOUT * 2)
+    scheduler = make_scheduler(deadline=1)
+
+    def slow(identifier):
+        time.sleep(0.3)
+        return {"Company Name": "ACME"}
+
+    assert scheduler.lookup("A", slow) == {"Company Name": "ACME"}
+    assert scheduler.breaker.failures == 0
+
+
+def test_concurrent_lookups_of_one_identifier_share_a_fetch():
+    scheduler = make_scheduler()
+    entered = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(identifier):
+        calls.append(identifier)
+        entered.set()
+        release.wait(5)
+        return {"Company Name": "ACME"}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(scheduler.lookup("A", slow)))
+    leader.start()
+    entered.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(scheduler.lookup("A", slow))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert calls == ["A"]
+    assert results == [{"Company Name": "ACME"}] * 4
+
+
+def test_snapshot_reports_each_source(monkeypatch):
+    monkeypatch.setattr(lookup_scheduler, "SCHEDULERS", {})
+    lookup_scheduler.lookup("zaubacorp", "A", lambda identifier: None)
+    assert lookup_scheduler.snapshot() == {
+        "zaubacorp": {"in_flight": 0, "consecutive_failures": 0, "circuit_open": False}}
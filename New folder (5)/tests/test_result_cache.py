@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+from result_cache import ResultCache
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = ResultCache("test", path=str(path))
+    assert not path.exists()
+    assert cache.get("a") is None
+    assert path.exists()
+
+
+def test_values_survive_a_reopen(tmp_path):
+    cache = ResultCache("test", path=str(tmp_path / "cache.sqlite3"), memory_size=0)
+    cache.set("a", {"Company Name": "ACME"})
+    cache.reopen()
+    assert cache.get("a") == {"Company Name": "ACME"}
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_importing_the_module_creates_no_database(tmp_path):
+    # Run from an empty directory with the default path, as an app started from anywhere would be.
+    env = {key: value for key, value in os.environ.items() if key != "CACHE_DB_PATH"}
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import result_cache"], cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
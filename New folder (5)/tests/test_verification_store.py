@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+from verification_store import VerificationStore
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / "verifications.sqlite3"
+    store = VerificationStore(str(path))
+    assert not path.exists()
+    assert store.history(cin="U72900KA2019PTC123456") == []
+    assert path.exists()
+
+
+def test_record_then_history(tmp_path):
+    store = VerificationStore(str(tmp_path / "verifications.sqlite3"))
+    summary = {"cin": "u72900ka2019ptc123456", "status": "Valid", "valid": True, "registry": {"Company Name": "ACME"}}
+    first = store.record("main", "abc", "a.jpg", ["ACME"], summary)
+    second = store.record("main", "abc", "a.jpg", ["ACME"], summary, source="reverify")
+    history = store.history(cin="U72900KA2019PTC123456")
+    assert [record["id"] for record in history] == [second, first]
+    assert [record["latest"] for record in history] == [1, 0]
+
+
+def test_importing_the_module_creates_no_database(tmp_path):
+    # Run from an empty directory with the default paths, as an app started from anywhere would be.
+    env = {key: value for key, value in os.environ.items() if key not in ("CACHE_DB_PATH", "VERIFICATION_DB_PATH")}
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import verification_store"], cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
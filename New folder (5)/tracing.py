@@ -0,0 +1,81 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+# Upload stages run from milliseconds (parsing) to tens of seconds (a slow registry page).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_SECONDS = Histogram("verification_stage_seconds", "Time spent in each verification stage.",
+                          ["stage"], buckets=STAGE_BUCKETS)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Stage timings of one upload, summed per stage (a PDF runs OCR once per page)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        with self._lock:
+            stages = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 1), "stages_ms": stages}
+
+
+@contextmanager
+def trace():
+    """Collect the spans of everything run in this context, including jobs submitted from it."""
+    current = Trace()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+def record(name, seconds):
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    current = _current.get()
+    if current is not None:
+        current.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def record_timings(prefix, timings):
+    """Record a ``timings`` dict as filled in by ``ocr_engine`` and ``preprocess``."""
+    for stage, seconds in timings.items():
+        record(f"{prefix}.{stage}", seconds)
+
+
+def metrics():
+    """The Prometheus exposition text, merged across worker processes when serve.py runs several."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,77 @@
+import io
+import os
+
+# Certificates are single scans or short PDFs; anything bigger is refused rather than buffered.
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 20 * 1024 * 1024))
+# The largest batch archive accepted, and the most its documents may add up to once extracted.
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 200 * 1024 * 1024))
+# Room for the multipart boundaries and form fields around an upload.
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Uploads are processed in memory; set UPLOAD_AUDIT=1 to also keep a copy of each one on disk.
+UPLOAD_AUDIT = os.environ.get("UPLOAD_AUDIT", "0") == "1"
+UPLOAD_AUDIT_DIR = os.environ.get("UPLOAD_AUDIT_DIR", "uploads")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def check_size(data, limit=UPLOAD_MAX_BYTES):
+    """Return ``data`` if it fits in ``limit`` bytes; read one byte past the limit so oversize uploads show."""
+    if len(data) > limit:
+        raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+    return data
+
+
+def read_upload(stream, limit=UPLOAD_MAX_BYTES):
+    """Read an upload's (spooled) stream into memory, refusing anything over ``limit`` bytes."""
+    return check_size(stream.read(limit + 1), limit)
+
+
+def copy_upload(source, destination, limit):
+    """Copy an upload's stream to ``destination`` in chunks, refusing anything over ``limit`` bytes."""
+    copied = 0
+    for chunk in iter(lambda: source.read(1 << 20), b""):
+        copied += len(chunk)
+        if copied > limit:
+            raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+        destination.write(chunk)
+    return copied
+
+
+def configure_flask(app):
+    """Cap a Flask app's request bodies at ``UPLOAD_MAX_BYTES`` and keep uploads that fit in memory.
+
+    Otherwise Werkzeug reads any body before the view can refuse it, and
+    spools every file over 500 KB to a temporary file. A view that accepts
+    bigger bodies (the batch endpoint) raises ``request.max_content_length``.
+    """
+    from flask import Request
+
+    class InMemoryUploadRequest(Request):
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            if total_content_length is not None and total_content_length <= UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES:
+                return io.BytesIO()
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    app.request_class = InMemoryUploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+
+
+def audit_copy(data, digest, filename):
+    """Keep a copy of the upload under its content hash when auditing is on; returns its path or None.
+
+    Naming by hash rather than by the client's filename means two users
+    uploading ``certificate.jpg`` never overwrite each other.
+    """
+    if not UPLOAD_AUDIT:
+        return None
+    extension = os.path.splitext(filename)[1].lower()
+    path = os.path.join(UPLOAD_AUDIT_DIR, digest + extension)
+    if not os.path.exists(path):
+        os.makedirs(UPLOAD_AUDIT_DIR, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+    return path
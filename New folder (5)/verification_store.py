@@ -0,0 +1,246 @@
+"""History of every verification, and re-verification of the ones whose registry record has gone stale.
+
+    python verification_store.py reverify [--limit 50] [--max-age 604800]
+    python verification_store.py history --cin U72900KA2019PTC123456
+
+Run ``reverify`` from cron, or set ``REVERIFY_INTERVAL`` to have each
+``serve.py`` worker do it in the background. Only the registry is looked up
+again; the OCR fields recorded the first time are re-validated as they are.
+"""
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import lookup_scheduler
+import result_cache
+import tracing
+
+VERIFICATION_DB_PATH = os.environ.get("VERIFICATION_DB_PATH", "verifications.sqlite3")
+# A verification whose registry snapshot is older than this is due for a re-check.
+REVERIFY_AFTER = float(os.environ.get("REVERIFY_AFTER", 7 * 24 * 60 * 60))
+# Seconds between background re-verification runs; 0 leaves it to the command line.
+REVERIFY_INTERVAL = float(os.environ.get("REVERIFY_INTERVAL", 0))
+REVERIFY_BATCH = int(os.environ.get("REVERIFY_BATCH", 50))
+# A claimed re-check that hasn't finished after this long may be picked up by another worker.
+REVERIFY_CLAIM_TIMEOUT = 15 * 60
+HISTORY_LIMIT = 50
+
+JSON_COLUMNS = ("details", "registry", "field_matches", "timings")
+
+
+# -------------------- Store --------------------
+class VerificationStore:
+    """Verifications in SQLite, indexed by CIN/LLPIN, GSTIN, PAN and document hash.
+
+    Every upload, batch row and re-check adds a row; the newest row per
+    document and pipeline is marked ``latest`` and is the one re-checked.
+    """
+
+    def __init__(self, path=VERIFICATION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread and per process, as in jobs.JobStore. The file and its schema are
+        # only created on first use, so importing an app doesn't leave a database wherever it was run.
+        if getattr(self._local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.row_factory = sqlite3.Row
+            self._create_schema(db)
+            self._local.db, self._local.pid = db, os.getpid()
+        return self._local.db
+
+    @staticmethod
+    def _create_schema(db):
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS verifications ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, pipeline TEXT NOT NULL, doc_type TEXT, digest TEXT NOT NULL,"
+            " filename TEXT, cin TEXT, gstin TEXT, pan TEXT, status TEXT, valid INTEGER NOT NULL,"
+            " details TEXT, registry TEXT, field_matches TEXT, timings TEXT, source TEXT NOT NULL,"
+            " verified_at REAL NOT NULL, registry_checked_at REAL, latest INTEGER NOT NULL, claimed_at REAL)"
+        )
+        for column in ("cin", "gstin", "pan", "digest"):
+            db.execute(f"CREATE INDEX IF NOT EXISTS verifications_{column} ON verifications ({column}, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS verifications_due ON verifications (latest, registry_checked_at)")
+
+    def record(self, pipeline, digest, filename, details, summary, timings=None, source="upload",
+               registry_checked=None):
+        """Add a verification; ``summary`` is the pipeline's ``verification_summary`` of its result.
+
+        ``registry_checked`` says the registry answered, even if it had no
+        record; by default that is assumed only when it returned one.
+        """
+        now = time.time()
+        if registry_checked is None:
+            registry_checked = bool(summary.get("registry"))
+        cin, gstin, pan = (normalize(summary.get(name)) for name in ("cin", "gstin", "pan"))
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("UPDATE verifications SET latest = 0 WHERE digest = ? AND pipeline = ? AND latest = 1",
+                       (digest, pipeline))
+            cursor = db.execute(
+                "INSERT INTO verifications (pipeline, doc_type, digest, filename, cin, gstin, pan, status, valid,"
+                " details, registry, field_matches, timings, source, verified_at, registry_checked_at, latest)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                (pipeline, summary.get("doc_type"), digest, filename, cin, gstin, pan, summary.get("status"),
+                 int(bool(summary.get("valid"))), json.dumps(details), json.dumps(summary.get("registry")), json.dumps(summary.get("field_matches")), json.dumps(timings),
+                 source, now, now if registry_checked else None),
+            )
+        return cursor.lastrowid
+
+    def get(self, verification_id):
+        row = self._connect().execute("SELECT * FROM verifications WHERE id = ?", (verification_id,)).fetchone()
+        return to_dict(row) if row else None
+
+    def history(self, cin=None, gstin=None, pan=None, digest=None, limit=HISTORY_LIMIT):
+        """Verifications matching every given identifier, newest first."""
+        filters = {"cin": cin, "gstin": gstin, "pan": pan, "digest": digest}
+        where = [f"{column} = ?" for column, value in filters.items() if value]
+        values = [normalize(value) if column != "digest" else value for column, value in filters.items() if value]
+        rows = self._connect().execute(
+            "SELECT * FROM verifications" + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY id DESC LIMIT ?", (*values, limit)).fetchall()
+        return [to_dict(row) for row in rows]
+
+    def due(self, max_age=REVERIFY_AFTER, limit=REVERIFY_BATCH):
+        """Latest verifications of a looked-up identifier whose registry snapshot is missing or older than ``max_age``."""
+        rows = self._connect().execute(
+            "SELECT * FROM verifications WHERE latest = 1 AND (cin IS NOT NULL OR gstin IS NOT NULL)"
+            " AND (registry_checked_at IS NULL OR registry_checked_at < ?)"
+            " AND (claimed_at IS NULL OR claimed_at < ?) ORDER BY registry_checked_at LIMIT ?",
+            (time.time() - max_age, time.time() - REVERIFY_CLAIM_TIMEOUT, limit)).fetchall()
+        return [to_dict(row) for row in rows]
+
+    def claim(self, verification_id):
+        """Take a due verification for re-checking; False if another worker got it first."""
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE verifications SET claimed_at = ? WHERE id = ? AND latest = 1"
+            " AND (claimed_at IS NULL OR claimed_at < ?)",
+            (now, verification_id, now - REVERIFY_CLAIM_TIMEOUT)).rowcount == 1
+
+    def release(self, verification_id):
+        self._connect().execute("UPDATE verifications SET claimed_at = NULL WHERE id = ?", (verification_id,))
+
+
+def normalize(identifier):
+    return result_cache.normalize_identifier(identifier) if identifier else None
+
+
+def to_dict(row):
+    record = dict(row)
+    for column in JSON_COLUMNS:
+        record[column] = json.loads(record[column]) if record[column] else None
+    record["valid"] = bool(record["valid"])
+    del record["claimed_at"]
+    return record
+
+
+store = VerificationStore()
+
+
+def save(pipeline, digest, filename, details, result, source="upload", registry_checked=None):
+    """Record a pipeline's ``validate_document`` result, with the current trace's timings; never raises.
+
+    The verification itself has already finished, so a result that can't be
+    summarized or stored is logged rather than failing it.
+    """
+    trace = tracing.current_trace()
+    # Named by file, so re-verification can import it even when the app was started as __main__.
+    name = os.path.splitext(os.path.basename(pipeline.__file__))[0]
+    try:
+        return store.record(name, digest, filename, details, pipeline.verification_summary(result),
+                            trace.breakdown() if trace else None, source, registry_checked)
+    except Exception as e:
+        print(f"Could not record verification of {filename}: {e!r}")
+        return None
+
+
+# -------------------- Re-verification --------------------
+class RecordedLookup:
+    """Hands ``validate_document`` a registry record already fetched, in place of a ``LookupPrefetch``."""
+
+    def __init__(self, record):
+        self.record = record
+
+    def resolve(self, identifier):
+        return self.record
+
+
+def reverify(record):
+    """Look a verification's identifier up again and re-validate its recorded OCR fields; None if the registry is down."""
+    pipeline = importlib.import_module(record["pipeline"])
+    try:
+        with tracing.trace():
+            registry = pipeline.cached_registry_lookup(record["cin"] or record["gstin"], refresh=True)
+            result = pipeline.validate_document(record["details"], prefetch=RecordedLookup(registry))
+            return save(pipeline, record["digest"], record["filename"], record["details"], result,
+                        source="reverify", registry_checked=True)
+    except lookup_scheduler.RegistryUnavailable as e:
+        print(f"Re-verification of {record['id']} postponed: {e}")
+        return None
+
+
+def reverify_due(max_age=REVERIFY_AFTER, limit=REVERIFY_BATCH):
+    """Re-check up to ``limit`` stale verifications; returns how many were re-verified."""
+    done = 0
+    for record in store.due(max_age, limit):
+        if not store.claim(record["id"]):
+            continue
+        try:
+            if reverify(record) is not None:
+                done += 1
+        except Exception as e:
+            print(f"Re-verification of {record['id']} failed: {e!r}")
+        finally:
+            store.release(record["id"])
+    return done
+
+
+def start_scheduler(interval=REVERIFY_INTERVAL):
+    """Re-verify stale records every ``interval`` seconds on a daemon thread; does nothing when it's 0."""
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                done = reverify_due()
+                if done:
+                    print(f"Re-verified {done} stale verifications")
+            except Exception as e:
+                print(f"Scheduled re-verification failed: {e!r}")
+
+    thread = threading.Thread(target=run, name="reverify", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    reverify_parser = commands.add_parser("reverify", help="re-check verifications with a stale registry snapshot")
+    reverify_parser.add_argument("--limit", type=int, default=REVERIFY_BATCH)
+    reverify_parser.add_argument("--max-age", type=float, default=REVERIFY_AFTER, help="seconds")
+    history_parser = commands.add_parser("history", help="print verifications as JSON lines, newest first")
+    for identifier in ("cin", "gstin", "pan", "digest"):
+        history_parser.add_argument(f"--{identifier}")
+    history_parser.add_argument("--limit", type=int, default=HISTORY_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == "reverify":
+        print(f"Re-verified {reverify_due(args.max_age, args.limit)} verifications")
+    else:
+        for record in store.history(args.cin, args.gstin, args.pan, args.digest, args.limit):
+            print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Loads the OCR engines and browsers in the background, so a worker can answer requests while they start.
+
+The apps call ``start()`` at startup instead of loading the pools before
+serving. ``/healthz`` answers as soon as the app is imported, while
+``/readyz`` answers 503 until the pools in ``READINESS_POOLS`` are warm, so
+a load balancer only sends uploads to warm workers. An upload that arrives
+before then still works; it loads what it needs on first use.
+"""
+import os
+import threading
+import time
+
+import ocr_engine
+import scraper_pool
+
+# Pools that must be warm before /readyz reports ready; drop "browser" when every registry is read over HTTP.
+READINESS_POOLS = [name for name in os.environ.get("READINESS_POOLS", "ocr,browser").split(",") if name]
+# Seconds before a pool that failed to load is tried again.
+WARMUP_RETRY_INTERVAL = float(os.environ.get("WARMUP_RETRY_INTERVAL", 30))
+
+POOLS = {
+    "ocr": lambda: ocr_engine.pool.warm_up(),
+    "browser": lambda: scraper_pool.pool.start(),
+}
+
+STARTED_AT = time.time()
+
+
+class PoolWarmup:
+    """Loads one pool, retrying until it succeeds, and remembers how that went."""
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.state = "cold"
+        self.error = None
+        self.seconds = None
+        self.attempts = 0
+
+    def run(self):
+        while True:
+            self.state = "warming"
+            self.attempts += 1
+            start = time.perf_counter()
+            try:
+                self.load()
+            except Exception as e:
+                self.state, self.error = "failed", repr(e)
+                print(f"Warming up the {self.name} pool failed, retrying in {WARMUP_RETRY_INTERVAL:.0f}s: {e!r}")
+                time.sleep(WARMUP_RETRY_INTERVAL)
+                continue
+            self.state, self.error, self.seconds = "warm", None, round(time.perf_counter() - start, 3)
+            print(f"{self.name} pool warm after {self.seconds:.1f}s")
+            return
+
+    def snapshot(self):
+        return {"state": self.state, "seconds": self.seconds, "attempts": self.attempts, "error": self.error}
+
+
+_warmups = {}
+_pid = None
+_lock = threading.Lock()
+
+
+def start(pools=None):
+    """Warm each pool on its own daemon thread; does nothing if this process already started them."""
+    global _pid
+    with _lock:
+        # Threads don't survive a fork, so a forked worker starts its own.
+        if _pid == os.getpid():
+            return
+        _pid = os.getpid()
+        _warmups.clear()
+        for name, load in (pools or POOLS).items():
+            _warmups[name] = PoolWarmup(name, load)
+            threading.Thread(target=_warmups[name].run, name=f"warmup-{name}", daemon=True).start()
+
+
+def liveness():
+    """The process is up and serving; never depends on the pools."""
+    return {"status": "alive", "pid": os.getpid(), "uptime": round(time.time() - STARTED_AT, 1)}
+
+
+def readiness():
+    """Whether every pool in ``READINESS_POOLS`` is warm, with each pool's state."""
+    pools = {name: warmup.snapshot() for name, warmup in _warmups.items()}
+    ready = all(pools.get(name, {}).get("state") == "warm" for name in READINESS_POOLS)
+    return {"ready": ready, "pools": pools}